@@ -0,0 +1,39 @@
+"""Speed of the machine the benchmarks run on, to compare across machines.
+
+Absolute timings only mean something next to timings from the same
+machine. The benchmarks time this fixed kernel in the same session and
+save it with their results, and --compare divides both sides by their
+own calibration, so a baseline saved on one machine is usable on
+another: a regression is a kernel getting slower relative to the
+calibration, not the new machine being slower overall.
+
+The kernel is the kind of work the library spends its time on, a small
+numpy matmul recurrence stepped from Python, so interpreter and numpy
+dispatch speed both count.
+"""
+
+import timeit
+
+import numpy as np
+
+SEED = 0
+STEPS = 200
+
+
+def _kernel(A: np.ndarray, x_0: np.ndarray) -> np.ndarray:
+  """Euler steps of x_dot = Ax, one small matmul per step."""
+  x = x_0
+  for _ in range(STEPS):
+    x = x + 1E-3*(A@x)
+  return x
+
+def calibrate(repeat: int=5) -> float:
+  """Best-of-repeat seconds per run of the calibration kernel.
+
+  repeat: int: number of timeit runs"""
+  rng = np.random.default_rng(SEED)
+  A = rng.standard_normal((4, 4)) - 2*np.eye(4)
+  x_0 = rng.standard_normal(4)
+  timer = timeit.Timer(lambda: _kernel(A, x_0))
+  number, _ = timer.autorange()
+  return min(timer.repeat(repeat=repeat, number=number))/number
@@ -0,0 +1,78 @@
+"""Measure worker start-up cost of the library against a budget.
+
+Each entry is imported in a fresh interpreter (best of a few runs) and
+checked both for wall time and for heavy modules it must not drag in.
+Exits non-zero if any entry blows its budget.
+
+  python benchmarks/import_time.py [--repeat 5] [--json out.json]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# statement: (budget in seconds, modules that must not be loaded)
+BUDGETS = {
+  "import modeling_systems": (0.02, ("numpy", "scipy", "matplotlib", "control")),
+  "from modeling_systems import simulate, simulate_final, rk2_step": (0.3, ("scipy", "matplotlib", "control")),
+  "from modeling_systems import DCMotor, WIP, DIP, StateFeedbackRegulator, StateEstimator": (0.3, ("scipy", "matplotlib", "control")),
+  "from modeling_systems import ctrb, obsv, feedforward_gain": (0.3, ("scipy", "matplotlib", "control")),
+  "from modeling_systems import lqr, place, SteadyStateKalmanFilter": (0.3, ("scipy", "matplotlib", "control")),
+}
+
+PROBE = """
+import sys, time, json
+start = time.perf_counter()
+{statement}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "modules": sorted(sys.modules)}}))
+"""
+
+
+def measure(statement: str, repeat: int) -> dict:
+  """Best-of-repeat import time of statement in a fresh interpreter.
+
+  statement: str: import statement to time
+  repeat: int: number of fresh interpreters to try"""
+  best = None
+  for _ in range(repeat):
+    out = subprocess.run([sys.executable, "-c", PROBE.format(statement=statement)],
+                         cwd=ROOT, capture_output=True, text=True, check=True)
+    result = json.loads(out.stdout.strip().splitlines()[-1])
+    if best is None or result["seconds"] < best["seconds"]:
+      best = result
+  return best
+
+def main() -> int:
+  """Time every entry in BUDGETS and report which ones are over."""
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  parser.add_argument("--repeat", type=int, default=5)
+  parser.add_argument("--json", help="write the results to this file")
+  args = parser.parse_args()
+
+  failed = False
+  report = {}
+  for statement, (budget, forbidden) in BUDGETS.items():
+    result = measure(statement, args.repeat)
+    top_level = {name.split(".")[0] for name in result["modules"]}
+    leaked = sorted(top_level.intersection(forbidden))
+    ok = result["seconds"] <= budget and not leaked
+    failed |= not ok
+    report[statement] = {"seconds": result["seconds"], "budget": budget,
+                         "leaked": leaked, "ok": ok}
+    status = "ok" if ok else "OVER BUDGET"
+    print(f"{result['seconds']*1e3:8.1f} ms / {budget*1e3:6.0f} ms  {status:11s} {statement}"
+          + (f"  (loaded {', '.join(leaked)})" if leaked else ""))
+
+  if args.json:
+    with open(args.json, "w") as f:
+      json.dump(report, f, indent=2)
+  return 1 if failed else 0
+
+
+if __name__ == "__main__":
+  sys.exit(main())
@@ -0,0 +1,261 @@
+"""Re-run the practicum evaluations headless and time them end to end.
+
+Every workload is the simulation half of an evaluation in python/ (same
+plants, gains, horizons and time steps, no plotting), run in a fresh
+interpreter so its peak RSS is its own. Reports wall time (best of a
+few runs), peak RSS and simulated steps per second.
+
+  python benchmarks/macro.py [--repeat 3] [--only practicum2_eval3] [--json out.json]
+  python benchmarks/macro.py --save            # refresh the baseline
+  python benchmarks/macro.py --compare         # fail on regressions
+  python benchmarks/macro.py --compare --baseline mine.json
+
+The baseline lives in benchmarks/baselines/macro.json. Wall time depends
+on the machine, so every run also times the calibration kernel (see
+calibration.py) and --compare checks each workload's time relative to
+it, which carries over from the machine the baseline was saved on.
+"""
+
+import argparse
+import json
+import math
+import os
+import resource
+import subprocess
+import sys
+import time
+
+from calibration import calibrate
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE = os.path.join(ROOT, "benchmarks", "baselines", "macro.json")
+
+
+def practicum1_compare_integrators() -> int:
+  """Evaluation 1: Euler vs RK2 on the pendulum, b = 0.05 and 0.5."""
+  import numpy as np
+  from modeling_systems import Pendulum, simulate
+  steps = 0
+  for b in (0.05, 0.5):
+    plant = Pendulum(m=0.5, l=0.2, b=b)
+    for delta_t in (0.2, 0.1, 0.01, 0.001):
+      for stepper in ("euler", "rk2"):
+        t, x = simulate(plant, lambda x, t: 0.0, np.array([math.pi/6, 0]),
+                        0, 4, delta_t, outputs=(), stepper=stepper)
+        steps += len(t) - 1
+  return steps
+
+def practicum2_eval3() -> int:
+  """Evaluation 3: four PID controllers on the DC motor, 14 s @ 1 ms."""
+  import numpy as np
+  from modeling_systems import (DCMotor, DCMotorConfig, PIDController,
+                                PIDControllerConfig, simulate)
+  delta_t = 0.001
+  motor = DCMotor(DCMotorConfig(R=1.8, L=0.85e-2, Km=4.6, Ktau=6.2, b=0.035, J=0.032))
+  steps = 0
+  for Kp, Ki in ((10, 100), (0, 10), (2.0, 0), (10.0, 0)):
+    pid = PIDController(PIDControllerConfig(Kp=Kp, Ki=Ki, Kd=0,
+                                            delta_t=delta_t, setpoint=1.0))
+    t, x = simulate(motor, pid, np.array([1, 0, 0]), 0, 14, delta_t, outputs=())
+    steps += len(t) - 1
+  return steps
+
+def practicum3_eval1() -> int:
+  """Evaluation 1: the three designed pole sets on the DC motor."""
+  import numpy as np
+  from modeling_systems import (DCMotor, DCMotorConfig, StateFeedbackRegulator,
+                                feedforward_gain, place, simulate)
+  motor = DCMotor(DCMotorConfig(R=10, L=0.85, Km=4.6, Ktau=6.2, b=0.35, J=0.32))
+  A, B, C = motor.A, motor.B, motor.C
+  steps = 0
+  for m_p, t_s in ((0.15, 1.0), (0.10, 0.5), (0.01, 0.1)):
+    damping = 1/math.sqrt(math.pi**2/math.log(m_p)**2 + 1)
+    omega = 4/(damping*t_s)
+    root = omega*np.emath.sqrt(damping**2 - 1)
+    K = place(A, B, [-damping*omega + root, -damping*omega - root, -4])
+    k_f = feedforward_gain(K=K, A=A, B=B, C=C)
+    controller = StateFeedbackRegulator(K=K, k_f=k_f, setpoint=1)
+    t, x, u = simulate(motor, controller, np.array([0, 0, 0]), 0, 3, 0.001)
+    steps += len(t) - 1
+  return steps
+
+def practicum4_simulate_final() -> int:
+  """Evaluation 3: LQR + state estimator, with and without the estimator."""
+  import numpy as np
+  from modeling_systems import (DCMotor, DCMotorConfig, StateEstimator,
+                                StateFeedbackRegulator, feedforward_gain, lqr,
+                                place_observer, simulate, simulate_final)
+  motor = DCMotor(DCMotorConfig(R=10, L=0.85, Km=4.6, Ktau=6.2, b=0.35, J=0.32))
+  A, B, C = motor.A, motor.B, motor.C
+  K, S, E = lqr(A, B, np.eye(3), 1/144)
+  k_f = feedforward_gain(K=K, A=A, B=B, C=C)
+  estimator = StateEstimator(plant=motor, L=place_observer(A, C, E*3))
+  controller = StateFeedbackRegulator(K=K, k_f=k_f, setpoint=1)
+  xhat_0 = np.random.default_rng(0).standard_normal(3)
+  t, x, u = simulate(motor, controller, np.array([0, 0, 0]), 0, 10, 0.001)
+  results = simulate_final(motor, estimator, controller, np.array([0, 0, 0]),
+                           xhat_0, 0, 10, 0.001)
+  return len(t) - 1 + len(results[0]) - 1
+
+def _piecewise(t: float) -> float:
+  """Honors DIP evaluation 2: turn right, then left."""
+  if (t >= 0.5 and t<=3):
+    return 1
+  elif (t >= 5.5 and t<=8.0):
+    return -1
+  else:
+    return 0
+
+def honors_wip() -> int:
+  """WIP evaluations 1 and 2."""
+  import numpy as np
+  from modeling_systems import WIP, StateFeedbackRegulator, feedforward_gain, lqr, simulate
+  wip = WIP()
+  scenarios = (
+    ([[0.1, 0, 0], [0, 0.1, 0], [0, 0, 1]], lambda t: 0, [0, 0, 0], 3),
+    ([[0.1, 0, 0], [0, 0.1, 0], [0, 0, 1]], lambda t: 1, [-math.pi/10, 0, 0], 3),
+    ([[1, 0, 0], [0, 1, 0], [0, 0, 0]], lambda t: 1, [-math.pi/10, 0, 0], 15),
+  )
+  steps = 0
+  for Q_x, setpoint, x_0, duration in scenarios:
+    K, S, E = lqr(wip.A, wip.B, Q_x, 1/81)
+    k_f = feedforward_gain(K=K, A=wip.A, B=wip.B, C=wip.C)
+    controller = StateFeedbackRegulator(K=K, k_f=k_f, setpoint=setpoint)
+    t, x, u = simulate(wip, controller, np.array(x_0), 0, duration, 0.001)
+    steps += len(t) - 1
+  return steps
+
+def honors_dip() -> int:
+  """DIP evaluations 1 to 3."""
+  import numpy as np
+  from modeling_systems import DIP, StateFeedbackRegulator, feedforward_gain, lqr, simulate
+  dip = DIP()
+  Q_gamma = [[0.1, 0, 0, 0], [0, 1, 0, 0], [0, 0, 0.1, 0], [0, 0, 0, 0.1]]
+  scenarios = (
+    (Q_gamma, lambda t: 0),
+    (Q_gamma, lambda t: 1),
+    (Q_gamma, _piecewise),
+    (np.eye(4), _piecewise),
+  )
+  steps = 0
+  for Q_x, setpoint in scenarios:
+    K, S, E = lqr(dip.A, dip.B, Q_x, 1/81)
+    k_f = feedforward_gain(K=K, A=dip.A, B=dip.B, C=dip.C)
+    controller = StateFeedbackRegulator(K=K, k_f=k_f, setpoint=setpoint)
+    t, x, u = simulate(dip, controller, np.zeros(4), 0, 10, 0.001)
+    steps += len(t) - 1
+  return steps
+
+WORKLOADS = {
+  "practicum1_compare_integrators": practicum1_compare_integrators,
+  "practicum2_eval3": practicum2_eval3,
+  "practicum3_eval1": practicum3_eval1,
+  "practicum4_simulate_final": practicum4_simulate_final,
+  "honors_wip": honors_wip,
+  "honors_dip": honors_dip,
+}
+
+
+def _peak_rss_mb() -> float:
+  """Peak resident set size of this process so far."""
+  peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+  # kilobytes on Linux, bytes on macOS
+  return peak/2**20 if sys.platform == "darwin" else peak/2**10
+
+def child(name: str) -> None:
+  """Run one workload in this interpreter and print its result."""
+  sys.path.insert(0, ROOT)
+  import numpy
+  import modeling_systems
+  baseline_rss = _peak_rss_mb()
+  start = time.perf_counter()
+  steps = WORKLOADS[name]()
+  elapsed = time.perf_counter() - start
+  print(json.dumps({"seconds": elapsed, "steps": steps,
+                    "peak_rss_mb": _peak_rss_mb(),
+                    "baseline_rss_mb": baseline_rss}))
+
+def measure(name: str, repeat: int) -> dict:
+  """Best-of-repeat run of a workload, each in a fresh interpreter.
+
+  name: str: key in WORKLOADS
+  repeat: int: number of fresh interpreters to try"""
+  best = None
+  for _ in range(repeat):
+    out = subprocess.run([sys.executable, __file__, "--child", name],
+                         cwd=ROOT, capture_output=True, text=True, check=True)
+    result = json.loads(out.stdout.strip().splitlines()[-1])
+    if best is None or result["seconds"] < best["seconds"]:
+      best = result
+  best["steps_per_second"] = best["steps"]/best["seconds"]
+  return best
+
+def compare(report: dict, baseline: dict, tolerance: float) -> bool:
+  """Print the ratio to the baseline for each workload, both normalized
+  by their calibration, True if all are within tolerance.
+
+  report: dict: fresh results
+  baseline: dict: saved results
+  tolerance: float: allowed slowdown, e.g. 1.25"""
+  machine = report["calibration_seconds"]/baseline["calibration_seconds"]
+  print(f"{machine:7.2f}x  calibration (this machine against the baseline's)")
+  ok = True
+  saved = baseline["results"]
+  for name, result in report["results"].items():
+    if name not in saved:
+      print(f"{'new':>8s}  {name}")
+      continue
+    ratio = result["seconds"]/saved[name]["seconds"]/machine
+    regressed = ratio > tolerance
+    ok &= not regressed
+    print(f"{ratio:7.2f}x  {'REGRESSED' if regressed else 'ok':9s} {name}")
+  return ok
+
+def main() -> int:
+  """Run every workload and optionally save or compare a baseline."""
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  parser.add_argument("--repeat", type=int, default=3)
+  parser.add_argument("--only", action="append", choices=sorted(WORKLOADS),
+                      help="run just this workload (can be repeated)")
+  parser.add_argument("--json", help="write the results to this file")
+  parser.add_argument("--save", action="store_true",
+                      help=f"overwrite the baseline ({os.path.relpath(BASELINE, ROOT)})")
+  parser.add_argument("--compare", action="store_true",
+                      help="exit non-zero if a workload is slower than the baseline")
+  parser.add_argument("--baseline", default=BASELINE,
+                      help="results to compare against, e.g. from --json")
+  parser.add_argument("--tolerance", type=float, default=1.25)
+  parser.add_argument("--child", help=argparse.SUPPRESS)
+  args = parser.parse_args()
+
+  if args.child:
+    child(args.child)
+    return 0
+
+  report = {"calibration_seconds": calibrate(), "results": {}}
+  for name in args.only or WORKLOADS:
+    result = measure(name, args.repeat)
+    report["results"][name] = result
+    print(f"{result['seconds']:8.3f} s  {result['peak_rss_mb']:7.1f} MB  "
+          f"{result['steps_per_second']:12,.0f} steps/s  {name}")
+
+  # Best of before and after, like every timing here is a best of
+  report["calibration_seconds"] = min(report["calibration_seconds"], calibrate())
+
+  if args.json:
+    with open(args.json, "w") as f:
+      json.dump(report, f, indent=2)
+  if args.save:
+    os.makedirs(os.path.dirname(BASELINE), exist_ok=True)
+    with open(BASELINE, "w") as f:
+      json.dump(report, f, indent=2)
+  if args.compare:
+    with open(args.baseline) as f:
+      baseline = json.load(f)
+    print()
+    return 0 if compare(report, baseline, args.tolerance) else 1
+  return 0
+
+
+if __name__ == "__main__":
+  sys.exit(main())
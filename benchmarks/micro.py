@@ -0,0 +1,174 @@
+"""Per-call cost of the stepping and dynamics kernels.
+
+Each kernel is timed in isolation on a fixed, seeded fixture (best of a
+few timeit runs) and traced once with tracemalloc for the memory it
+allocates per call. Kernels that scale with the state dimension are run
+at every size in SIZES.
+
+  python benchmarks/micro.py [--repeat 5] [--json out.json]
+  python benchmarks/micro.py --save            # refresh the baseline
+  python benchmarks/micro.py --compare         # fail on regressions
+  python benchmarks/micro.py --compare --baseline mine.json
+
+The baseline lives in benchmarks/baselines/micro.json. ns/call depends
+on the machine, so every run also times the calibration kernel (see
+calibration.py) and --compare checks each kernel's time relative to it,
+which carries over from the machine the baseline was saved on.
+"""
+
+import argparse
+import json
+import os
+import sys
+import timeit
+import tracemalloc
+
+import numpy as np
+
+from calibration import calibrate
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from modeling_systems import DCMotor
+from modeling_systems import DCMotorConfig
+from modeling_systems import DIP
+from modeling_systems import PIDController
+from modeling_systems import PIDControllerConfig
+from modeling_systems import StateFeedbackRegulator
+from modeling_systems import WIP
+from modeling_systems import euler_step
+from modeling_systems import pendulum_dynamics
+from modeling_systems import rk2_step
+
+BASELINE = os.path.join(ROOT, "benchmarks", "baselines", "micro.json")
+SIZES = (3, 10, 100)
+SEED = 0
+DELTA_T = 1E-3
+
+
+def _linear_dynamics(n: int):
+  """Stable random x_dot = Ax + Bu of size n with a single input."""
+  rng = np.random.default_rng(SEED)
+  A = rng.standard_normal((n, n))/np.sqrt(n) - 2*np.eye(n)
+  B = rng.standard_normal((n, 1))
+  return lambda x, u: A@x + B@np.atleast_1d(u)
+
+def _held(u):
+  """Input function holding u."""
+  return lambda t: u
+
+def kernels() -> dict:
+  """name: zero-argument callable running the kernel once."""
+  motor = DCMotor(DCMotorConfig(R=10, L=0.85, b=0.35, J=0.32, Km=4.6, Ktau=6.2))
+  wip = WIP()
+  dip = DIP()
+  pid = PIDController(PIDControllerConfig(Kp=2.0, Ki=0.5, Kd=0.1,
+                                          delta_t=DELTA_T, setpoint=1.0))
+  rng = np.random.default_rng(SEED)
+
+  table = {
+    "DCMotorDynamics.__call__[n=3]": lambda x=rng.standard_normal(3): motor.dynamics(x, 0.5),
+    "WIP.dynamics[n=3]": lambda x=rng.standard_normal(3): wip.dynamics(x, 0.5),
+    "DIP.dynamics[n=4]": lambda x=rng.standard_normal(4): dip.dynamics(x, 0.5),
+    "pendulum_dynamics[n=2]": lambda x=rng.standard_normal(2): pendulum_dynamics(x, 0.5),
+    "PIDController.__call__": lambda: pid(0.25, 0.0),
+  }
+  for n in SIZES:
+    x = rng.standard_normal(n)
+    dyn = _linear_dynamics(n)
+    u_func = _held(0.5)
+    regulator = StateFeedbackRegulator(rng.standard_normal((1, n)), 1.0, 1.0)
+    table[f"rk2_step[n={n}]"] = lambda dyn=dyn, u_func=u_func, x=x: rk2_step(dyn, u_func, x, 0.0, DELTA_T)
+    table[f"euler_step[n={n}]"] = lambda dyn=dyn, u_func=u_func, x=x: euler_step(dyn, u_func, x, 0.0, DELTA_T)
+    table[f"StateFeedbackRegulator.__call__[n={n}]"] = lambda regulator=regulator, x=x: regulator(x, 0.0)
+  return table
+
+def measure(func, repeat: int) -> dict:
+  """Best-of-repeat ns/call, plus what a single call allocates.
+
+  func: zero-argument callable to measure
+  repeat: int: number of timeit runs"""
+  timer = timeit.Timer(func)
+  number, _ = timer.autorange()
+  best = min(timer.repeat(repeat=repeat, number=number))/number
+
+  # Warm up, then trace one call: peak is everything it had alive at
+  # once, blocks is what it left behind
+  func()
+  tracemalloc.start()
+  before, _ = tracemalloc.get_traced_memory()
+  tracemalloc.reset_peak()
+  blocks = sys.getallocatedblocks()
+  func()
+  # The int holding the block count is one block itself
+  blocks = sys.getallocatedblocks() - blocks - 1
+  _, peak = tracemalloc.get_traced_memory()
+  tracemalloc.stop()
+  return {"ns_per_call": best*1E9, "peak_bytes_per_call": peak - before,
+          "retained_blocks_per_call": blocks}
+
+def compare(report: dict, baseline: dict, tolerance: float) -> bool:
+  """Print the ratio to the baseline for each kernel, both normalized by
+  their calibration, True if all are within tolerance.
+
+  report: dict: fresh results
+  baseline: dict: saved results
+  tolerance: float: allowed slowdown, e.g. 1.25"""
+  machine = report["calibration_seconds"]/baseline["calibration_seconds"]
+  print(f"{machine:7.2f}x  calibration (this machine against the baseline's)")
+  ok = True
+  saved = baseline["results"]
+  for name, result in report["results"].items():
+    if name not in saved:
+      print(f"{'new':>8s}  {name}")
+      continue
+    ratio = result["ns_per_call"]/saved[name]["ns_per_call"]/machine
+    grew = result["peak_bytes_per_call"] > saved[name]["peak_bytes_per_call"]
+    regressed = ratio > tolerance or grew
+    ok &= not regressed
+    print(f"{ratio:7.2f}x  {'REGRESSED' if regressed else 'ok':9s} {name}"
+          + ("  (allocates more)" if grew else ""))
+  return ok
+
+def main() -> int:
+  """Measure every kernel and optionally save or compare a baseline."""
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  parser.add_argument("--repeat", type=int, default=5)
+  parser.add_argument("--json", help="write the results to this file")
+  parser.add_argument("--save", action="store_true",
+                      help=f"overwrite the baseline ({os.path.relpath(BASELINE, ROOT)})")
+  parser.add_argument("--compare", action="store_true",
+                      help="exit non-zero if a kernel is slower than the baseline")
+  parser.add_argument("--baseline", default=BASELINE,
+                      help="results to compare against, e.g. from --json")
+  parser.add_argument("--tolerance", type=float, default=1.25)
+  args = parser.parse_args()
+
+  report = {"calibration_seconds": calibrate(args.repeat), "results": {}}
+  for name, func in kernels().items():
+    result = measure(func, args.repeat)
+    report["results"][name] = result
+    print(f"{result['ns_per_call']:10.0f} ns  {result['peak_bytes_per_call']:7d} B  "
+          f"{result['retained_blocks_per_call']:3d} blk  {name}")
+
+  # Best of before and after, like every timing here is a best of
+  report["calibration_seconds"] = min(report["calibration_seconds"], calibrate(args.repeat))
+
+  if args.json:
+    with open(args.json, "w") as f:
+      json.dump(report, f, indent=2)
+  if args.save:
+    os.makedirs(os.path.dirname(BASELINE), exist_ok=True)
+    with open(BASELINE, "w") as f:
+      json.dump(report, f, indent=2)
+  if args.compare:
+    with open(args.baseline) as f:
+      baseline = json.load(f)
+    print()
+    return 0 if compare(report, baseline, args.tolerance) else 1
+  return 0
+
+
+if __name__ == "__main__":
+  sys.exit(main())
@@ -0,0 +1,220 @@
+"""Scaling curves of the library across state dimension, batch and horizon.
+
+Random stable LTI plants (x_dot = Ax + Bu, y = Cx, single input and
+output) are generated per state dimension, and each code path is timed
+along one axis at a time, with the other two held at their defaults:
+
+  n:       ctrb, obsv, lqr, simulate (fused fast path), simulate_loop
+           (the general stepping loop, forced by asking for stats)
+  batch:   simulate with a batch of initial conditions
+  horizon: simulate and simulate_loop
+
+A log-log fit of time against the swept axis gives the complexity
+exponent of every curve. Once a point takes longer than --max-seconds,
+or would need more than --max-memory for its logs, the larger points of
+that curve are skipped and reported as where the path falls over.
+
+  python benchmarks/scaling.py [--full] [--json out.json] [--plot out.png]
+
+--full sweeps n up to 2000, batch up to 1e5 and horizon up to 1e7 steps.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from modeling_systems import StateFeedbackRegulator
+from modeling_systems import ctrb
+from modeling_systems import lqr
+from modeling_systems import obsv
+from modeling_systems import simulate
+
+SEED = 0
+DELTA_T = 1E-3
+DEFAULTS = {"n": 4, "batch": 1, "horizon": 1000}
+GRIDS = {
+  "n": [3, 10, 30, 100, 300],
+  "batch": [1, 10, 100, 1000],
+  "horizon": [1000, 10000, 100000],
+}
+FULL_GRIDS = {
+  "n": [3, 10, 30, 100, 300, 1000, 2000],
+  "batch": [1, 10, 100, 1000, 10000, 100000],
+  "horizon": [1000, 10000, 100000, 1000000, 10000000],
+}
+OPS = {
+  "n": ("ctrb", "obsv", "lqr", "simulate", "simulate_loop"),
+  "batch": ("simulate",),
+  "horizon": ("simulate", "simulate_loop"),
+}
+
+
+class RandomPlant:
+  """Random stable single input / single output LTI plant."""
+  linear = True
+
+  def __init__(self, n: int, seed: int=SEED) -> None:
+    """Draw A with its spectrum inside a unit disk centred on -1.5.
+
+    n: int: state dimension
+    seed: int: seed of the generator"""
+    rng = np.random.default_rng(seed)
+    self.A = rng.standard_normal((n, n))/np.sqrt(n) - 1.5*np.eye(n)
+    self.B = rng.standard_normal((n, 1))
+    self.C = rng.standard_normal((1, n))
+
+  def dynamics(self, x: np.ndarray, u: float) -> np.ndarray:
+    """Perform xdot = Ax+Bu."""
+    return self.A@x + self.B@np.atleast_1d(u)
+
+  def output(self, x: np.ndarray) -> np.ndarray:
+    """Returns Cx."""
+    return self.C@x
+
+
+def log_bytes(n: int, batch: int, horizon: int) -> int:
+  """Memory simulate needs for its x, u and y logs.
+
+  n: int: state dimension
+  batch: int: number of initial conditions
+  horizon: int: number of steps"""
+  return 8*(horizon + 1)*batch*(n + 2)
+
+def run(op: str, n: int, batch: int, horizon: int) -> float:
+  """Time one operation once, in seconds.
+
+  op: str: name from OPS
+  n: int: state dimension
+  batch: int: number of initial conditions
+  horizon: int: number of steps"""
+  plant = RandomPlant(n)
+  if op == "ctrb":
+    start = time.perf_counter()
+    ctrb(plant.A, plant.B)
+  elif op == "obsv":
+    start = time.perf_counter()
+    obsv(plant.A, plant.C)
+  elif op == "lqr":
+    start = time.perf_counter()
+    lqr(plant.A, plant.B, np.eye(n), 1.0)
+  else:
+    # The plant is stable on its own, so a zero gain keeps it that way
+    controller = StateFeedbackRegulator(np.zeros((1, n)), 1.0, 1.0)
+    x_0 = np.random.default_rng(SEED).standard_normal((batch, n) if batch > 1 else n)
+    stats = {} if op == "simulate_loop" else None
+    start = time.perf_counter()
+    simulate(plant, controller, x_0, 0, horizon*DELTA_T, DELTA_T,
+             outputs=("u", "y"), stats=stats)
+  return time.perf_counter() - start
+
+def measure(op: str, n: int, batch: int, horizon: int) -> float:
+  """Best of a few runs for fast points, a single run for slow ones."""
+  best = run(op, n, batch, horizon)
+  spent = best
+  for _ in range(4):
+    if spent > 0.5:
+      break
+    seconds = run(op, n, batch, horizon)
+    best = min(best, seconds)
+    spent += seconds
+  return best
+
+def fit_exponent(sizes: list, seconds: list) -> float:
+  """Slope of log(seconds) against log(size), over the points above a
+  millisecond (below that the fixed per-call overhead dominates)."""
+  sizes = np.asarray(sizes, dtype=float)
+  seconds = np.asarray(seconds, dtype=float)
+  keep = seconds >= 1E-3
+  if keep.sum() < 2:
+    keep = np.ones_like(keep)
+  if keep.sum() < 2:
+    return float("nan")
+  return float(np.polyfit(np.log(sizes[keep]), np.log(seconds[keep]), 1)[0])
+
+def sweep(axis: str, op: str, grid: list, max_seconds: float, max_memory: float) -> dict:
+  """Time op along axis, stopping at the first point over budget.
+
+  returns: {"sizes", "seconds", "exponent", "stopped_at", "reason"}"""
+  curve = {"sizes": [], "seconds": [], "stopped_at": None, "reason": None}
+  for size in grid:
+    point = dict(DEFAULTS, **{axis: size})
+    if op == "simulate_loop" and point["batch"] > 1:
+      continue
+    if op.startswith("simulate") and log_bytes(**point) > max_memory:
+      curve["stopped_at"], curve["reason"] = size, "memory"
+      break
+    seconds = measure(op, **point)
+    curve["sizes"].append(size)
+    curve["seconds"].append(seconds)
+    print(f"{axis:>8s}={size:<9d} {seconds*1e3:12.2f} ms  {op}", flush=True)
+    if seconds > max_seconds:
+      following = grid[grid.index(size)+1:]
+      if following:
+        curve["stopped_at"], curve["reason"] = following[0], "time"
+      break
+  curve["exponent"] = fit_exponent(curve["sizes"], curve["seconds"])
+  return curve
+
+def plot(report: dict, path: str) -> None:
+  """Log-log curves, one panel per axis."""
+  # matplotlib is heavy, only pay for it when a plot is asked for
+  import matplotlib
+  matplotlib.use("Agg")
+  import matplotlib.pyplot as plt
+  fig, axs = plt.subplots(1, len(report), figsize=(5*len(report), 4))
+  for ax, (axis, curves) in zip(np.atleast_1d(axs), report.items()):
+    for op, curve in curves.items():
+      ax.loglog(curve["sizes"], curve["seconds"], marker="o",
+                label=f"{op} (~{axis}^{curve['exponent']:.2f})")
+    ax.set_xlabel(axis)
+    ax.set_ylabel("Time $(s)$")
+    ax.grid(visible=True, which='major', color='#AAAAAA', linewidth=1.0)
+    ax.legend()
+  fig.tight_layout()
+  fig.savefig(path)
+
+def main() -> int:
+  """Run every sweep and print the fitted exponents."""
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  parser.add_argument("--full", action="store_true",
+                      help="sweep the full ranges (slow, needs a lot of memory)")
+  parser.add_argument("--axis", action="append", choices=sorted(GRIDS),
+                      help="only sweep this axis (can be repeated)")
+  parser.add_argument("--max-seconds", type=float, default=10.0,
+                      help="stop a curve after a point slower than this")
+  parser.add_argument("--max-memory", type=float, default=2.0,
+                      help="skip simulate points whose logs need more GB than this")
+  parser.add_argument("--json", help="write the curves to this file")
+  parser.add_argument("--plot", help="save log-log curves to this image")
+  args = parser.parse_args()
+
+  grids = FULL_GRIDS if args.full else GRIDS
+  report = {}
+  for axis in args.axis or grids:
+    report[axis] = {op: sweep(axis, op, grids[axis], args.max_seconds, args.max_memory*2**30)
+                    for op in OPS[axis]}
+
+  print()
+  for axis, curves in report.items():
+    for op, curve in curves.items():
+      stop = (f"  falls over at {axis}={curve['stopped_at']} ({curve['reason']})"
+              if curve["stopped_at"] is not None else "")
+      print(f"{op:>14s} ~ {axis}^{curve['exponent']:.2f}{stop}")
+
+  if args.json:
+    with open(args.json, "w") as f:
+      json.dump({"defaults": DEFAULTS, "curves": report}, f, indent=2)
+  if args.plot:
+    plot(report, args.plot)
+  return 0
+
+
+if __name__ == "__main__":
+  sys.exit(main())
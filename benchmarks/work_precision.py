@@ -0,0 +1,143 @@
+"""Work-precision diagrams of the steppers on plants with exact solutions.
+
+rc_dynamics and the DC motor are linear, so with a constant input the
+exact state on the time grid comes from the zero-order-hold matrices
+(one matrix exponential). Every stepper in STEPPERS is run through
+simulate() at a geometric sequence of time steps, and the max error
+over the trajectory is recorded against wall time and against the
+number of dynamics evaluations.
+
+  python benchmarks/work_precision.py [--json out.json] [--plot out.png]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from modeling_systems import CallCounter
+from modeling_systems import DCMotor
+from modeling_systems import DCMotorConfig
+from modeling_systems import STEPPERS
+from modeling_systems import rc_dynamics
+from modeling_systems import simulate
+from modeling_systems import zoh
+
+DELTA_TS = [0.2/2**k for k in range(12)]
+
+
+class _RC:
+  """rc_dynamics as a simulate() plant."""
+  def __init__(self) -> None:
+    # rc_dynamics is linear, so differences give A and B exactly
+    f_0 = rc_dynamics(0.0, 0.0)
+    self.A = np.array([[rc_dynamics(1.0, 0.0) - f_0]])
+    self.B = np.array([[rc_dynamics(0.0, 1.0) - f_0]])
+    self.C = np.array([[1.0]])
+
+  def dynamics(self, x, u):
+    return rc_dynamics(x, u)
+
+  def output(self, x):
+    return x
+
+
+def problems() -> dict:
+  """name: (plant, constant input, x_0, duration), from practicums 1 and 2."""
+  motor = DCMotor(DCMotorConfig(R=10, L=0.85, b=0.35, J=0.32, Km=4.6, Ktau=6.2))
+  return {
+    "rc_dynamics": (_RC(), 5.0, np.array([0.0]), 10.0),
+    "DCMotor": (motor, 1.0, np.array([0.0, 0.0, 0.0]), 3.0),
+  }
+
+def exact(plant, u: float, x_0: np.ndarray, t_vals: np.ndarray, delta_t: float) -> np.ndarray:
+  """Exact states of a linear plant under constant input on t_vals."""
+  phi, gamma = zoh(plant.A, plant.B, delta_t)
+  drive = gamma@np.atleast_1d(u)
+  x_vals = np.zeros((len(t_vals), len(x_0)))
+  x_vals[0] = x_0
+  for i in range(1, len(t_vals)):
+    x_vals[i] = phi@x_vals[i-1] + drive
+  return x_vals
+
+def measure(plant, u: float, x_0: np.ndarray, duration: float, stepper: str,
+            delta_t: float, repeat: int) -> dict:
+  """Error, best wall time and dynamics evaluations of one run."""
+  controller = lambda x, t: u
+  best = None
+  for _ in range(repeat):
+    start = time.perf_counter()
+    t_vals, x_vals = simulate(plant, controller, x_0, 0, duration, delta_t,
+                              outputs=(), stepper=stepper)
+    elapsed = time.perf_counter() - start
+    best = elapsed if best is None else min(best, elapsed)
+
+  # One more run to count evaluations, so the counter isn't in the timing
+  counted = CallCounter(plant.dynamics)
+  counted_plant = SimpleNamespace(dynamics=counted, output=plant.output)
+  simulate(counted_plant, controller, x_0, 0, duration, delta_t,
+           outputs=(), stepper=stepper)
+
+  error = np.abs(x_vals - exact(plant, u, x_0, t_vals, delta_t)).max()
+  return {"delta_t": delta_t, "error": float(error), "seconds": best,
+          "evaluations": counted.calls}
+
+def plot(report: dict, path: str) -> None:
+  """Error vs wall time and vs evaluations, one row per plant."""
+  # matplotlib is heavy, only pay for it when a plot is asked for
+  import matplotlib
+  matplotlib.use("Agg")
+  import matplotlib.pyplot as plt
+  fig, axs = plt.subplots(len(report), 2, figsize=(10, 4*len(report)), squeeze=False)
+  for row, (name, steppers) in zip(axs, report.items()):
+    for stepper, runs in steppers.items():
+      errors = [run["error"] for run in runs]
+      row[0].loglog([run["seconds"] for run in runs], errors, marker="o", label=stepper)
+      row[1].loglog([run["evaluations"] for run in runs], errors, marker="o", label=stepper)
+    row[0].set_xlabel("Wall time $(s)$")
+    row[1].set_xlabel("Function evaluations")
+    for ax in row:
+      ax.set_ylabel("Max error")
+      ax.set_title(name)
+      ax.grid(visible=True, which='major', color='#AAAAAA', linewidth=1.0)
+      ax.legend()
+  fig.tight_layout()
+  fig.savefig(path)
+
+def main() -> int:
+  """Sweep every stepper and time step on every problem."""
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  parser.add_argument("--repeat", type=int, default=3)
+  parser.add_argument("--json", help="write the results to this file")
+  parser.add_argument("--plot", help="save the log-log diagrams to this image")
+  args = parser.parse_args()
+
+  report = {}
+  for name, (plant, u, x_0, duration) in problems().items():
+    report[name] = {}
+    for stepper in STEPPERS:
+      runs = [measure(plant, u, x_0, duration, stepper, delta_t, args.repeat)
+              for delta_t in DELTA_TS]
+      report[name][stepper] = runs
+      for run in runs:
+        print(f"{name:>12s} {stepper:>6s} dt={run['delta_t']:<10.3g} "
+              f"error={run['error']:9.2e} {run['seconds']*1e3:9.2f} ms "
+              f"{run['evaluations']:8d} evals")
+
+  if args.json:
+    with open(args.json, "w") as f:
+      json.dump(report, f, indent=2)
+  if args.plot:
+    plot(report, args.plot)
+  return 0
+
+
+if __name__ == "__main__":
+  sys.exit(main())
@@ -0,0 +1,106 @@
+"""Reusable modeling and control code from the practicums.
+
+Importing the package is cheap: submodules (and numpy/scipy with them)
+are only loaded the first time one of their names is used, e.g.
+`from modeling_systems import simulate_final` loads the simulation
+module and nothing else.
+"""
+
+import importlib
+
+__version__ = "0.1.0"
+
+# Public name -> submodule it lives in
+_exports = {
+  "ConvergenceStudy": "accuracy",
+  "IntegratorChoice": "accuracy",
+  "ORDERS": "accuracy",
+  "convergence_study": "accuracy",
+  "observed_order": "accuracy",
+  "richardson_error": "accuracy",
+  "select_integrator": "accuracy",
+  "simulate_to_tolerance": "accuracy",
+  "RunCache": "cache",
+  "RunCatalog": "catalog",
+  "run_metrics": "catalog",
+  "ctrb": "analysis",
+  "is_controllable": "analysis",
+  "is_obsv": "analysis",
+  "obsv": "analysis",
+  "AugmentedSystem": "augmented",
+  "augmented_system": "augmented",
+  "simulate_augmented": "augmented",
+  "PIDController": "controllers",
+  "PIDControllerConfig": "controllers",
+  "StateFeedbackRegulator": "controllers",
+  "feedforward_gain": "controllers",
+  "euler_matrices": "discretize",
+  "rk2_matrices": "discretize",
+  "rk4_matrices": "discretize",
+  "zoh": "discretize",
+  "StateEstimator": "estimators",
+  "SteadyStateKalmanFilter": "kalman",
+  "NoiseBuffer": "noise",
+  "quantize": "noise",
+  "PolePlacement": "placement",
+  "place": "placement",
+  "place_observer": "placement",
+  "DCMotor": "plants",
+  "DCMotorConfig": "plants",
+  "DCMotorDynamics": "plants",
+  "DIP": "plants",
+  "Pendulum": "plants",
+  "WIP": "plants",
+  "pendulum_dynamics": "plants",
+  "rc_dynamics": "plants",
+  "DENSITY_ABOVE": "plotting",
+  "POINTS_PER_PIXEL": "plotting",
+  "downsample": "plotting",
+  "lttb_indices": "plotting",
+  "minmax_indices": "plotting",
+  "plot_downsampled": "plotting",
+  "plot_overlay": "plotting",
+  "plot_trajectory": "plotting",
+  "Profiler": "profiling",
+  "PlotSpec": "report",
+  "render_report": "report",
+  "care": "riccati",
+  "dare": "riccati",
+  "dlqr": "riccati",
+  "lqr": "riccati",
+  "CallCounter": "simulation",
+  "EVALUATIONS": "simulation",
+  "STEPPERS": "simulation",
+  "euler_step": "simulation",
+  "rk2_step": "simulation",
+  "rk4_step": "simulation",
+  "simulate": "simulation",
+  "simulate_final": "simulation",
+  "STABILITY_POLYNOMIALS": "stability",
+  "StepAdvice": "stability",
+  "advise_step": "stability",
+  "amplification": "stability",
+  "closed_loop_spectrum": "stability",
+  "stability_limit": "stability",
+  "Recording": "recording",
+  "StopCondition": "stopping",
+  "TrajectoryFile": "storage",
+  "load_trajectory": "storage",
+  "save_trajectory": "storage",
+  "Trajectory": "trajectory",
+}
+
+__all__ = sorted(_exports)
+
+
+def __getattr__(name: str):
+  """Import the submodule that defines name on first use."""
+  if name not in _exports:
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+  value = getattr(importlib.import_module(f".{_exports[name]}", __name__), name)
+  globals()[name] = value
+  return value
+
+def __dir__():
+  """List the lazy names alongside the loaded ones."""
+  return sorted(set(globals()) | set(_exports))
@@ -0,0 +1,365 @@
+"""Pick the integrator and time step from an error tolerance.
+
+Instead of delta_t=0.001 by habit, select_integrator() runs short pilot
+simulations of the actual loop and estimates the global error of each
+(stepper, delta_t) by step doubling: runs at delta_t and delta_t/2
+differ by about (1 - 2^-p) times the error of the coarse one, where p is
+the order the loop converges at (Richardson's estimate).
+
+p is measured from a third run at delta_t/4 rather than taken from the
+stepper. The controller is evaluated once per step and held, so a closed
+loop converges to its continuous-time limit at first order whatever the
+stepper is, while an open-loop run with a smooth input gets the
+stepper's full order. For every stepper delta_t is shrunk, along that
+order, until the estimate is under the tolerance, and the pair with the
+cheapest projected production run wins.
+
+convergence_study() runs a whole geometric sequence of time steps (in
+worker processes), reports the observed order between each consecutive
+three and combines the runs by repeated Richardson extrapolation into a
+trajectory on the coarsest grid that is more accurate than the finest
+run, for a fraction of what a run that accurate would cost.
+"""
+
+import copy
+import logging
+import os
+import pickle
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from numpy.typing import ArrayLike
+from dataclasses import dataclass
+from dataclasses import field
+from typing import Sequence
+from typing import Tuple
+
+from .simulation import simulate
+from .trajectory import Trajectory
+
+logger = logging.getLogger(__name__)
+
+# Order of accuracy of each stepper in STEPPERS, the most a loop can show
+ORDERS = {
+  "euler": 1,
+  "rk2": 2,
+  "rk4": 4,
+}
+
+
+@dataclass
+class IntegratorChoice:
+  """The (stepper, delta_t) select_integrator() settled on.
+
+  stepper: str: name in STEPPERS
+  delta_t: float: time step
+  order: float: order of convergence observed in the pilot
+  error_estimate: float: estimated max state error over the pilot
+  estimated_seconds: float: projected wall time of the full run
+  tolerance: float: the tolerance it was picked for
+  pilots: list: every pilot tried, as dicts of stepper, delta_t,
+    order, error_estimate and seconds_per_step"""
+  stepper: str
+  delta_t: float
+  order: float
+  error_estimate: float
+  estimated_seconds: float
+  tolerance: float
+  pilots: list = field(default_factory=list)
+
+
+@dataclass
+class ConvergenceStudy:
+  """Runs of one loop at a geometric sequence of time steps.
+
+  stepper: str: name in STEPPERS
+  delta_ts: list: time steps, coarsest first
+  t: np.ndarray: (T,) coarsest time grid, the one everything is sampled on
+  runs: list: (T, n) states of every run on t
+  orders: list: observed order of every three consecutive runs
+  order: int: leading order the extrapolation assumed
+  extrapolated: np.ndarray: (T, n) Richardson-extrapolated states on t
+  error_estimate: float: max difference between the extrapolation and
+    the one a level lower, a (pessimistic) bound on its error
+  seconds: list: wall time of every run"""
+  stepper: str
+  delta_ts: list
+  t: np.ndarray
+  runs: list
+  orders: list
+  order: int
+  extrapolated: np.ndarray
+  error_estimate: float
+  seconds: list
+
+
+def _shared(coarse: ArrayLike, fine: ArrayLike, ratio: int=2) -> Tuple[ArrayLike, ArrayLike]:
+  """The samples of a run and one at 1/ratio its step that fall on the
+  same times (arange can give either run an extra sample at the end)."""
+  coarse = np.asarray(coarse)
+  fine = np.asarray(fine)
+  T = min(len(coarse), (len(fine) - 1)//ratio + 1)
+  return coarse[:T], fine[:(T-1)*ratio+1:ratio]
+
+def observed_order(coarse: ArrayLike, mid: ArrayLike, fine: ArrayLike, ratio: int=2) -> float:
+  """Order of convergence from runs at delta_t, delta_t/ratio and
+  delta_t/ratio^2: log base ratio of how much the difference between
+  successive runs shrinks.
+
+  coarse: ArrayLike: (T, ...) states at delta_t
+  mid: ArrayLike: states at delta_t/ratio
+  fine: ArrayLike: states at delta_t/ratio^2
+  ratio: int: ratio between successive steps"""
+  coarse, mid_c = _shared(coarse, mid, ratio)
+  mid, fine = _shared(mid, fine, ratio)
+  with np.errstate(all="ignore"):
+    shrink = np.abs(coarse - mid_c).max()/np.abs(mid - fine)[::ratio][:len(coarse)].max()
+    return float(np.log(shrink)/np.log(ratio))
+
+def richardson_error(coarse: ArrayLike, fine: ArrayLike, order: float, ratio: int=2) -> ArrayLike:
+  """Error of the coarse trajectory at every coarse sample, estimated
+  from a run at 1/ratio the step.
+
+  coarse: ArrayLike: (T, ...) states at delta_t
+  fine: ArrayLike: (~ratio*T, ...) states at delta_t/ratio over the same
+    horizon
+  order: float: order of convergence
+  ratio: int: ratio between the two steps
+
+  returns: (T', ...) estimated errors, T' <= T samples both runs share"""
+  coarse, fine = _shared(coarse, fine, ratio)
+  return (coarse - fine)*ratio**order/(ratio**order - 1)
+
+def _fresh(controller):
+  """Copy of controller, so stateful ones (PID) start every run clean."""
+  return copy.deepcopy(controller)
+
+def _pilot(plant, controller, x_0, t_0, t_f, delta_t, stepper, **kwargs) -> Tuple[float, float, float]:
+  """Observed order, estimated max error at delta_t and wall time per step."""
+  runs = []
+  for h in (delta_t, delta_t/2, delta_t/4):
+    start = time.perf_counter()
+    t_vals, x_vals = simulate(plant, _fresh(controller), x_0, t_0, t_f, h,
+                              outputs=(), stepper=stepper, **kwargs)
+    seconds_per_step = (time.perf_counter() - start)/max(len(t_vals) - 1, 1)
+    runs.append(x_vals)
+
+  # Clipped, so round-off (or no error at all) doesn't blow up the estimate
+  order = observed_order(*runs)
+  order = float(np.clip(order, 0.5, ORDERS[stepper])) if np.isfinite(order) else ORDERS[stepper]
+  with np.errstate(all="ignore"):
+    error = np.abs(richardson_error(runs[0], runs[1], order)).max()
+  if not np.isfinite(error):
+    error = np.inf
+  return order, float(error), seconds_per_step
+
+def select_integrator(plant,
+                      controller,
+                      x_0: ArrayLike,
+                      t_0: float,
+                      t_f: float,
+                      tolerance: float,
+                      steppers: Sequence[str]=("euler", "rk2", "rk4"),
+                      pilot: float=None,
+                      delta_t_max: float=None,
+                      delta_t_min: float=1E-6,
+                      **kwargs) -> IntegratorChoice:
+  """Cheapest (stepper, delta_t) whose estimated error is under tolerance.
+
+  The pilots simulate the first `pilot` seconds of the horizon with
+  copies of the controller, so stateful controllers aren't advanced.
+  Errors that keep growing after the pilot window aren't seen, so for
+  long unstable or marginal runs pass a longer pilot. Controllers with a
+  step of their own (PIDController's delta_t) behave differently at every
+  delta_t and don't converge, so they're best simulated at that step.
+
+  plant: what we are controlling
+  controller: controller from which input is received
+  x_0: ArrayLike: initial conditions
+  t_0: float: initial time
+  t_f: float: final time of the production run
+  tolerance: float: max state error allowed
+  steppers: Sequence[str]: steppers to consider, names in ORDERS
+  pilot: float: pilot horizon in seconds, defaults to a tenth of the
+    horizon (at least a second, at most all of it)
+  delta_t_max: float: largest step tried, defaults to pilot/20
+  delta_t_min: float: smallest step tried
+  kwargs: passed on to simulate() (estimator, xhat_0, ...)
+
+  returns: IntegratorChoice"""
+  if kwargs.get("process_noise") is not None or kwargs.get("sensor_noise") is not None:
+    raise ValueError("noise makes step-doubling error estimates meaningless, "
+                     "select the integrator without it")
+  horizon = t_f - t_0
+  if pilot is None:
+    pilot = min(horizon, max(horizon/10, 1.0))
+  if delta_t_max is None:
+    delta_t_max = pilot/20
+
+  pilots = []
+  best = None
+  for stepper in steppers:
+    delta_t = delta_t_max
+    while delta_t >= delta_t_min:
+      order, error, seconds_per_step = _pilot(plant, controller, x_0, t_0, t_0 + pilot,
+                                              delta_t, stepper, **kwargs)
+      estimated_seconds = seconds_per_step*horizon/delta_t
+      pilots.append({"stepper": stepper, "delta_t": delta_t, "order": order,
+                     "error_estimate": error, "seconds_per_step": seconds_per_step})
+      if error <= tolerance:
+        if best is None or estimated_seconds < best.estimated_seconds:
+          best = IntegratorChoice(stepper=stepper, delta_t=delta_t,
+                                  order=order, error_estimate=error,
+                                  estimated_seconds=estimated_seconds,
+                                  tolerance=tolerance)
+        break
+      # Error ~ delta_t^order, so jump (with a margin) to the step that
+      # should just make it (just halve after a blow-up), and give up on
+      # this stepper if that step is out of range or already costs more
+      # than a cheaper pick
+      if np.isfinite(error):
+        delta_t = min(delta_t/2, 0.9*delta_t*(tolerance/error)**(1/order))
+      else:
+        delta_t /= 2
+      if best is not None and seconds_per_step*horizon/delta_t > best.estimated_seconds:
+        break
+
+  if best is None:
+    raise ValueError(f"no stepper in {tuple(steppers)} reaches a tolerance of "
+                     f"{tolerance:g} with delta_t >= {delta_t_min:g}")
+  best.pilots = pilots
+  logger.info("picked %s at delta_t=%g (estimated error %.3g <= %.3g, ~%.3g s) "
+              "after %d pilots", best.stepper, best.delta_t, best.error_estimate,
+              tolerance, best.estimated_seconds, len(pilots))
+  return best
+
+def simulate_to_tolerance(plant,
+                          controller,
+                          x_0: ArrayLike,
+                          t_0: float,
+                          t_f: float,
+                          tolerance: float,
+                          outputs: Sequence[str]=("u",),
+                          steppers: Sequence[str]=("euler", "rk2", "rk4"),
+                          pilot: float=None,
+                          **kwargs) -> Tuple[Trajectory, IntegratorChoice]:
+  """simulate() with the stepper and delta_t picked by select_integrator().
+
+  plant: what we are controlling
+  controller: controller from which input is received
+  x_0: ArrayLike: initial conditions
+  t_0: float: initial time
+  t_f: float: final time
+  tolerance: float: max state error allowed
+  outputs: Sequence[str]: extra logs to return, as in simulate()
+  steppers: Sequence[str]: steppers to consider
+  pilot: float: pilot horizon in seconds
+  kwargs: passed on to simulate() (estimator, xhat_0, ...)
+
+  returns: (Trajectory, IntegratorChoice), the run and how it was
+    integrated"""
+  choice = select_integrator(plant, controller, x_0, t_0, t_f, tolerance,
+                             steppers=steppers, pilot=pilot, **kwargs)
+  traj = simulate(plant, controller, x_0, t_0, t_f, choice.delta_t,
+                  outputs=outputs, stepper=choice.stepper, **kwargs)
+  return traj, choice
+
+def _timed_run(plant, controller, x_0, t_0, t_f, delta_t, stepper, kwargs) -> Tuple:
+  """One run of a study, module level so worker processes can pickle it."""
+  start = time.perf_counter()
+  t_vals, x_vals = simulate(plant, controller, x_0, t_0, t_f, delta_t,
+                            outputs=(), stepper=stepper, **kwargs)
+  return t_vals, x_vals, time.perf_counter() - start
+
+def _picklable(*objs) -> bool:
+  """Whether objs can be sent to a worker process."""
+  try:
+    pickle.dumps(objs)
+  except (pickle.PicklingError, AttributeError, TypeError):
+    return False
+  return True
+
+def convergence_study(plant,
+                      controller,
+                      x_0: ArrayLike,
+                      t_0: float,
+                      t_f: float,
+                      delta_t: float,
+                      stepper: str="rk2",
+                      levels: int=4,
+                      ratio: int=2,
+                      workers: int=None,
+                      **kwargs) -> ConvergenceStudy:
+  """Run the loop at delta_t, delta_t/ratio, ... and extrapolate.
+
+  The runs are independent, so they go to a pool of worker processes
+  (the finest dominates, so the study takes about as long as it does).
+  Loops that can't be pickled, e.g. with a lambda controller, run in
+  this process instead.
+
+  The extrapolation assumes the error expands in powers order, order+1,
+  ... of delta_t and eliminates one more term per level (a Romberg
+  table). order is the observed order of the three finest runs rounded
+  to an integer, so a closed loop (first order, see the module
+  docstring) and an open loop (the stepper's order) are both handled.
+
+  plant: what we are controlling
+  controller: controller from which input is received
+  x_0: ArrayLike: initial conditions
+  t_0: float: initial time
+  t_f: float: final time
+  delta_t: float: coarsest time step
+  stepper: str: name in ORDERS
+  levels: int: number of runs
+  ratio: int: ratio between successive steps
+  workers: int: worker processes, defaults to one per run (up to the
+    number of CPUs), 1 runs everything in this process
+  kwargs: passed on to simulate() (estimator, xhat_0, ...)
+
+  returns: ConvergenceStudy"""
+  if levels < 2:
+    raise ValueError("a convergence study needs at least two levels")
+  if kwargs.get("process_noise") is not None or kwargs.get("sensor_noise") is not None:
+    raise ValueError("noise differs between runs at different steps, "
+                     "study the convergence without it")
+  delta_ts = [delta_t/ratio**k for k in range(levels)]
+  jobs = [(plant, _fresh(controller), x_0, t_0, t_f, h, stepper, kwargs) for h in delta_ts]
+  if workers is None:
+    workers = min(levels, os.cpu_count() or 1)
+  if workers > 1 and not _picklable(plant, controller, kwargs):
+    logger.info("loop can't be pickled, running the study in this process")
+    workers = 1
+  if workers > 1:
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+      # Finest first, so the longest run starts straight away
+      futures = [pool.submit(_timed_run, *job) for job in jobs[::-1]][::-1]
+      results = [future.result() for future in futures]
+  else:
+    results = [_timed_run(*job) for job in jobs]
+
+  # Everything on the coarsest grid
+  T = min((len(t_vals) - 1)//ratio**k + 1 for k, (t_vals, _, _) in enumerate(results))
+  t = results[0][0][:T]
+  runs = [x_vals[:(T-1)*ratio**k+1:ratio**k] for k, (_, x_vals, _) in enumerate(results)]
+
+  x_runs = [x_vals for _, x_vals, _ in results]
+  orders = [observed_order(*x_runs[k:k+3], ratio=ratio) for k in range(levels - 2)]
+  order = ORDERS[stepper]
+  if orders and np.isfinite(orders[-1]):
+    order = int(np.clip(round(orders[-1]), 1, ORDERS[stepper]))
+
+  # Romberg table: each column cancels the next power of delta_t
+  column = runs
+  previous = None
+  for j in range(levels - 1):
+    factor = ratio**(order + j) - 1
+    previous = column[-1]
+    column = [fine + (fine - coarse)/factor for coarse, fine in zip(column[:-1], column[1:])]
+  extrapolated = column[-1]
+  with np.errstate(all="ignore"):
+    error = float(np.abs(extrapolated - previous).max())
+
+  return ConvergenceStudy(stepper=stepper, delta_ts=delta_ts, t=t, runs=runs,
+                          orders=orders, order=order, extrapolated=extrapolated,
+                          error_estimate=error if np.isfinite(error) else np.inf,
+                          seconds=[seconds for _, _, seconds in results])
@@ -0,0 +1,35 @@
+"""Controllability and observability checks."""
+
+import numpy as np
+from numpy.typing import ArrayLike
+
+
+def ctrb(A: ArrayLike, B: ArrayLike) -> ArrayLike:
+  """Return the controlability matrix.
+  C = [B AB...]"""
+  C = B
+  for i in range(1, A.shape[0]):
+    temp_a = np.linalg.matrix_power(A, i)
+    C = np.hstack((C, temp_a@B))
+  return C
+
+def is_controllable(C: ArrayLike) -> bool:
+  """Calculates determinate of C. If != 0,
+  is full rank, and therefore controllable."""
+  return np.linalg.det(C) != 0
+
+def obsv(A: ArrayLike, C: ArrayLike) -> ArrayLike:
+  """Comput the observability grammian.
+
+  A: ArrayLike: A matrix
+  C: ArrayLike: C matrix"""
+  W = C
+  for i in range(1, A.shape[0]):
+    temp_a = np.linalg.matrix_power(A, i)
+    W = np.vstack((W, C@temp_a))
+  return W
+
+def is_obsv(W: ArrayLike) -> bool:
+  """Calculates determinate of C. If != 0,
+  is full rank, and therefore observable."""
+  return np.linalg.det(W) != 0
@@ -0,0 +1,209 @@
+"""On-disk cache of simulate() runs, keyed by what went into them.
+
+Re-running a notebook cell re-simulates scenarios it already ran. A
+RunCache hashes everything a run depends on (the plant's matrices and
+config, the controller's gains and state, the code and globals of any
+function involved, the estimator, x_0, the time grid, the stepper, the
+logs asked for and the package version) into a key, and
+keeps each run as a trajectory file (see storage.py) under it:
+
+  cache = RunCache("~/.cache/modeling_systems", max_bytes=2**30)
+  traj = cache.simulate(plant, controller, x_0, 0, 3, 1E-3, outputs=("u", "y"))
+
+The store is bounded: past max_bytes, the least recently used runs are
+deleted (every hit refreshes a run's modification time).
+
+Runs with noise, a stop condition, stats or a profiler aren't cached,
+they just run: their side effects on those objects are part of the
+result. Neither are runs holding an object the key can't tell apart
+from others of its type (one with no attributes to describe, like a
+random Generator), rather than risk handing back another run. A hit
+doesn't run the loop either, so a stateful controller (PID) isn't left
+in the state a run would leave it in.
+"""
+
+import hashlib
+import inspect
+import json
+import logging
+import os
+import tempfile
+from numpy.typing import ArrayLike
+from typing import Union
+
+from .simulation import simulate
+from .storage import FORMAT, _Undescribable, _describe, load_trajectory, save_trajectory
+from .trajectory import Trajectory
+
+logger = logging.getLogger(__name__)
+
+# Store size past which old runs are evicted
+MAX_BYTES = 1 << 30
+
+_SUFFIX = ".traj"
+
+# simulate() arguments that make a run uncacheable when set
+_UNCACHED = ("process_noise", "sensor_noise", "stop", "stats", "profiler")
+
+
+def _defaults(kwargs: dict) -> dict:
+  """kwargs with simulate()'s defaults filled in, so leaving one out and
+  passing it hash the same."""
+  parameters = inspect.signature(simulate).parameters
+  full = {name: parameter.default for name, parameter in parameters.items()
+          if parameter.default is not inspect.Parameter.empty}
+  unknown = set(kwargs) - set(full)
+  if unknown:
+    raise TypeError(f"simulate() got unexpected arguments {sorted(unknown)}")
+  full.update(kwargs)
+  # Same logs whatever container they were asked for in
+  full["outputs"] = list(full["outputs"])
+  return full
+
+
+class RunCache:
+  """Size-bounded store of simulate() results, least recently used out
+  first."""
+  def __init__(self, directory: str, max_bytes: int=MAX_BYTES) -> None:
+    """Open (or create) a store.
+
+    directory: str: where the runs are kept
+    max_bytes: int: size the store is trimmed back to after every new run"""
+    self.directory = os.path.expanduser(directory)
+    self.max_bytes = max_bytes
+    self.hits = 0
+    self.misses = 0
+    os.makedirs(self.directory, exist_ok=True)
+
+  def key(self,
+          plant,
+          controller,
+          x_0: ArrayLike,
+          t_0: float,
+          t_f: float,
+          delta_t: Union[float, str],
+          **kwargs) -> str:
+    """Key of a run: SHA-256 of its canonical JSON description.
+
+    Arguments are simulate()'s, defaults left out of kwargs are the same
+    run as passing them.
+
+    returns: hex digest
+
+    raises: TypeError if part of the run can't be described well enough
+      to tell it apart from other runs (e.g. an object without attributes)"""
+    from . import __version__
+    description = {
+      "version": __version__,
+      "format": FORMAT,
+      "plant": _describe(plant, strict=True),
+      "controller": _describe(controller, strict=True),
+      "x_0": _describe(x_0, strict=True),
+      "t_0": _describe(t_0, strict=True),
+      "t_f": _describe(t_f, strict=True),
+      "delta_t": _describe(delta_t, strict=True),
+      "kwargs": _describe(_defaults(kwargs), strict=True),
+    }
+    canonical = json.dumps(description, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+  def _path(self, key: str) -> str:
+    return os.path.join(self.directory, key + _SUFFIX)
+
+  def simulate(self,
+               plant,
+               controller,
+               x_0: ArrayLike,
+               t_0: float,
+               t_f: float,
+               delta_t: Union[float, str],
+               **kwargs) -> Trajectory:
+    """simulate(), from the store if this run is in it.
+
+    Arguments are simulate()'s.
+
+    returns: Trajectory"""
+    if any(kwargs.get(name) is not None for name in _UNCACHED):
+      return simulate(plant, controller, x_0, t_0, t_f, delta_t, **kwargs)
+
+    try:
+      key = self.key(plant, controller, x_0, t_0, t_f, delta_t, **kwargs)
+    except _Undescribable as e:
+      logger.info("not caching the run: %s", e)
+      return simulate(plant, controller, x_0, t_0, t_f, delta_t, **kwargs)
+    path = self._path(key)
+    try:
+      traj = load_trajectory(path, plant=plant)
+    except FileNotFoundError:
+      pass
+    else:
+      os.utime(path)
+      self.hits += 1
+      return Trajectory(traj.t, traj.x, traj.logs, traj.outputs, plant=plant,
+                        setpoint=getattr(controller, "setpoint", None),
+                        recording=traj.recording)
+
+    self.misses += 1
+    traj = simulate(plant, controller, x_0, t_0, t_f, delta_t, **kwargs)
+    # Written aside and moved in, so readers never see half a file
+    fd, scratch = tempfile.mkstemp(suffix=".tmp", dir=self.directory)
+    os.close(fd)
+    try:
+      save_trajectory(scratch, traj, controller=controller, estimator=kwargs.get("estimator"),
+                      delta_t=delta_t if delta_t != "auto" else None,
+                      stepper=kwargs.get("stepper", "rk2"), level=1)
+      os.replace(scratch, path)
+    finally:
+      if os.path.exists(scratch):
+        os.remove(scratch)
+    self.evict()
+    return traj
+
+  def _entries(self) -> list:
+    """(modification time, size, path) of every stored run."""
+    entries = []
+    with os.scandir(self.directory) as it:
+      for entry in it:
+        if entry.name.endswith(_SUFFIX):
+          stat = entry.stat()
+          entries.append((stat.st_mtime, stat.st_size, entry.path))
+    return entries
+
+  def evict(self, max_bytes: int=None) -> int:
+    """Delete the least recently used runs until the store fits.
+
+    max_bytes: int: size to fit in, the store's max_bytes by default
+
+    returns: number of runs deleted"""
+    max_bytes = self.max_bytes if max_bytes is None else max_bytes
+    entries = sorted(self._entries())
+    total = sum(size for _, size, _ in entries)
+    deleted = 0
+    for _, size, path in entries:
+      if total <= max_bytes:
+        break
+      try:
+        os.remove(path)
+      except FileNotFoundError:
+        pass
+      total -= size
+      deleted += 1
+    if deleted:
+      logger.info("evicted %d runs from %s", deleted, self.directory)
+    return deleted
+
+  def clear(self) -> None:
+    """Delete every stored run."""
+    self.evict(0)
+
+  @property
+  def size(self) -> int:
+    """Bytes stored."""
+    return sum(size for _, size, _ in self._entries())
+
+  def __len__(self) -> int:
+    return len(self._entries())
+
+  def __contains__(self, key: str) -> bool:
+    return os.path.exists(self._path(key))
+
@@ -0,0 +1,259 @@
+"""SQLite index of sweep runs: parameters and scalar metrics per run.
+
+After a sweep over thousands of (Q, R, poles, config) combinations, the
+questions are about scalars: which runs overshoot less than 5% with
+|u| under 9 V, which ten have the lowest cost. A RunCatalog keeps one
+row per run with its parameters, its metrics and the path of its
+trajectory file (see storage.py), so those are one indexed query instead
+of loading every trajectory:
+
+  catalog = RunCatalog("sweep.db")
+  for params in sweep:
+    traj = simulate(...)
+    save_trajectory(path, traj, controller=controller)
+    catalog.add(params, run_metrics(traj), path=path)
+  catalog.select("overshoot < ? AND peak_u < ?", (0.05, 9))
+  catalog.top("cost", 10)
+
+Columns are created as new parameter and metric names show up, each with
+its own index. Scalar parameters are stored as they are, anything else
+(poles, weight matrices) as JSON text. Metrics are always numbers: the
+metrics of a batched run, (N,) arrays, become N rows sharing its
+parameters and path, told apart by a "batch" column holding each one's
+index in the batch.
+"""
+
+import json
+import re
+import sqlite3
+import numpy as np
+from typing import Iterable, List, Sequence, Tuple, Union
+
+from .storage import _describe
+from .trajectory import Trajectory
+
+_TABLE = "runs"
+_NAME = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+
+
+def run_metrics(traj: Trajectory, target: float=None, settle_tol: float=0.02) -> dict:
+  """Step response metrics of a single output run, for the catalog.
+
+  traj: Trajectory: result of simulate(), batched runs give (N,) arrays
+  target: float: value y steps to, the setpoint by default
+  settle_tol: float: settling band, as a fraction of the step
+
+  returns: overshoot (fraction of the step), settling_time (last time
+    outside the band, inf if it ends outside), final_error, peak_y, and
+    with a u log peak_u (max |u|) and cost (the running cost's end)"""
+  y = traj.y
+  if target is None:
+    target = traj.reference[-1]
+  step = target - y[0]
+  scale = np.where(step != 0, np.abs(step), 1.0)
+  direction = np.where(step < 0, -1.0, 1.0)
+  overshoot = np.clip((direction*(y - target)).max(axis=0)/scale, 0, None)
+  outside = np.abs(y - target) > settle_tol*scale
+  # Index of the last sample outside the band, -1 if none
+  last = len(y) - 1 - np.argmax(outside[::-1], axis=0)
+  last = np.where(outside.any(axis=0), last, -1)
+  settling_time = np.where(last == len(y) - 1, np.inf,
+                           traj.t[np.clip(last + 1, 0, len(y) - 1)] - traj.t[0])
+  metrics = {
+    "overshoot": overshoot,
+    "settling_time": settling_time,
+    "final_error": target - y[-1],
+    "peak_y": np.abs(y).max(axis=0),
+  }
+  if "u" in traj.logs:
+    u = np.asarray(traj.u)
+    metrics["peak_u"] = np.abs(u.reshape(len(u), *np.shape(y)[1:], -1)).max(axis=(0, -1))
+    metrics["cost"] = traj.cost()[-1]
+  return {name: value.item() if np.ndim(value) == 0 else value
+          for name, value in metrics.items()}
+
+def _value(value):
+  """What sqlite stores for a parameter or metric (metrics are scalars
+  by then, see _rows())."""
+  if isinstance(value, np.generic) and not np.iscomplexobj(value):
+    value = value.item()
+  if value is None or isinstance(value, (bool, int, float, str)):
+    return value
+  return json.dumps(_describe(value))
+
+def _rows(params: dict, metrics: dict) -> List[dict]:
+  """Rows of a run: one, or one per member of a batched run, with the
+  metrics split across them and the parameters repeated."""
+  metrics = {name: np.asarray(value) for name, value in (metrics or {}).items()
+             if value is not None}
+  for name, value in metrics.items():
+    if value.dtype.kind not in "biuf":
+      raise TypeError(f"metric {name!r} must be a real number or an array of them, "
+                      f"got {value.dtype}")
+  try:
+    shape = np.broadcast_shapes(*[value.shape for value in metrics.values()])
+  except ValueError:
+    raise ValueError("the metrics of a batched run must share its shape") from None
+  if shape == ():
+    return [{**params, **{name: value.item() for name, value in metrics.items()}}]
+  if "batch" in params:
+    raise ValueError("batch is the catalog's column for the members of a batched run")
+  columns = {name: np.broadcast_to(value, shape).ravel() for name, value in metrics.items()}
+  return [{**params, "batch": k, **{name: column[k].item() for name, column in columns.items()}}
+          for k in range(int(np.prod(shape)))]
+
+def _column(name: str) -> str:
+  """Quoted column name, refusing anything that isn't an identifier."""
+  if not _NAME.fullmatch(name):
+    raise ValueError(f"{name!r} can't be a column name, use letters, digits and _")
+  return f'"{name}"'
+
+
+class RunCatalog:
+  """One row per run: id, path, parameters and metrics."""
+  def __init__(self, path: str) -> None:
+    """Open (or create) a catalog.
+
+    path: str: sqlite database file, ":memory:" for a throwaway one"""
+    self.path = path
+    self.connection = sqlite3.connect(path)
+    self.connection.row_factory = sqlite3.Row
+    # Sweeps write a lot and can redo a lost tail, readers don't block writers
+    self.connection.execute("PRAGMA journal_mode=WAL")
+    self.connection.execute("PRAGMA synchronous=NORMAL")
+    self.connection.execute(f"CREATE TABLE IF NOT EXISTS {_TABLE} "
+                            "(id INTEGER PRIMARY KEY, path TEXT)")
+    self._columns = self._existing()
+
+  def __enter__(self) -> "RunCatalog":
+    return self
+
+  def __exit__(self, *exc) -> None:
+    self.close()
+
+  def close(self) -> None:
+    self.connection.close()
+
+  def _existing(self) -> list:
+    return [row["name"] for row in self.connection.execute(f"PRAGMA table_info({_TABLE})")]
+
+  @property
+  def columns(self) -> Tuple[str, ...]:
+    """Names of every column: id, path, then parameters and metrics."""
+    return tuple(self._columns)
+
+  def _add_columns(self, names: Iterable[str]) -> None:
+    # sqlite column names ignore (ASCII) case
+    folded = {column.lower(): column for column in self._columns}
+    for name in names:
+      column = _column(name)
+      existing = folded.get(name.lower())
+      if existing == name:
+        continue
+      if existing is not None:
+        raise ValueError(f"{name!r} clashes with the column {existing!r}, "
+                         "column names ignore case")
+      folded[name.lower()] = name
+      self.connection.execute(f"ALTER TABLE {_TABLE} ADD COLUMN {column}")
+      self.connection.execute(f'CREATE INDEX IF NOT EXISTS "{_TABLE}_{name}" '
+                              f"ON {_TABLE} ({column})")
+      self._columns.append(name)
+
+  def add(self, params: dict, metrics: dict=None, path: str=None) -> Union[int, List[int]]:
+    """Index one run.
+
+    params: dict: what the run was, e.g. {"q_theta": 10, "poles": [...]}
+    metrics: dict: what came out, e.g. run_metrics(traj), numbers or the
+      (N,) arrays of a batched run
+    path: str: its trajectory file, if it was saved
+
+    returns: the run's id, or the ids of a batched run's members"""
+    (ids, batched), = self._insert([(params, metrics, path)])
+    return ids if batched else ids[0]
+
+  def add_many(self, runs: Iterable[tuple]) -> List[int]:
+    """Index many runs in one transaction.
+
+    runs: Iterable[tuple]: (params, metrics, path) of every run
+
+    returns: the runs' ids, a batched run's members one after another"""
+    return [id_ for ids, _ in self._insert(runs) for id_ in ids]
+
+  def _insert(self, runs: Iterable[tuple]) -> List[tuple]:
+    """Insert runs in one transaction, returning (ids, batched) per run."""
+    inserted = []
+    with self.connection:
+      for params, metrics, path in runs:
+        if {"id", "path"} & (set(params) | set(metrics or {})):
+          raise ValueError("id and path are the catalog's own columns")
+        rows = _rows(params, metrics)
+        ids = []
+        for row in rows:
+          self._add_columns(row)
+          names = ["path"] + list(row)
+          columns = ", ".join(_column(name) for name in names)
+          marks = ", ".join("?"*len(names))
+          cursor = self.connection.execute(
+            f"INSERT INTO {_TABLE} ({columns}) VALUES ({marks})",
+            [path] + [_value(value) for value in row.values()])
+          ids.append(cursor.lastrowid)
+        inserted.append((ids, "batch" in rows[0]))
+    return inserted
+
+  def select(self,
+             where: str=None,
+             args: Sequence=(),
+             columns: Sequence[str]=None,
+             order_by: str=None,
+             descending: bool=False,
+             limit: int=None) -> List[dict]:
+    """Runs matching a filter, without touching their trajectories.
+
+    where: str: SQL condition on the columns, with ? placeholders, e.g.
+      "overshoot < ? AND peak_u < ?"
+    args: Sequence: values of the placeholders
+    columns: Sequence[str]: columns to return, all by default
+    order_by: str: column to sort by
+    descending: bool: largest first
+    limit: int: at most this many runs
+
+    returns: one dict per run, column -> value"""
+    names = "*" if columns is None else ", ".join(_column(name) for name in columns)
+    query = f"SELECT {names} FROM {_TABLE}"
+    if where:
+      query += f" WHERE {where}"
+    if order_by is not None:
+      query += f" ORDER BY {_column(order_by)} {'DESC' if descending else 'ASC'}"
+    if limit is not None:
+      query += f" LIMIT {int(limit)}"
+    return [dict(row) for row in self.connection.execute(query, tuple(args))]
+
+  def top(self,
+          metric: str,
+          k: int,
+          where: str=None,
+          args: Sequence=(),
+          largest: bool=False) -> List[dict]:
+    """The k best runs by a metric, smallest first.
+
+    metric: str: column to rank by, runs without it are left out
+    k: int: number of runs
+    where: str: optional SQL condition, see select()
+    args: Sequence: values of its placeholders
+    largest: bool: rank largest first instead
+
+    returns: one dict per run"""
+    condition = f"{_column(metric)} IS NOT NULL"
+    if where:
+      condition += f" AND ({where})"
+    return self.select(condition, args, order_by=metric, descending=largest, limit=k)
+
+  def count(self, where: str=None, args: Sequence=()) -> int:
+    """Number of runs matching a filter."""
+    query = f"SELECT COUNT(*) FROM {_TABLE}"
+    if where:
+      query += f" WHERE {where}"
+    return self.connection.execute(query, tuple(args)).fetchone()[0]
+
+  def __len__(self) -> int:
+    return self.count()
@@ -0,0 +1,101 @@
+"""Controllers from the practicums: PID and state feedback."""
+
+import numpy as np
+from numpy.typing import ArrayLike
+from dataclasses import dataclass
+from typing import Callable
+from typing import Union
+
+
+@dataclass
+class PIDControllerConfig:
+  """Storing config constants for a PID controller.
+
+  Kp: float: proportional constant
+  Ki: float: integral constant
+  Kd: float: derivative constant
+  delta_t: float: time step
+  setpoint: float: desired output / reference"""
+  Kp: float
+  Ki: float
+  Kd: float
+  delta_t: float
+  setpoint: float
+
+
+class PIDController:
+  # Driven by the plant output rather than its state
+  feedback = "output"
+
+  def __init__(self, cfg: PIDControllerConfig) -> None:
+    """Set up member variables.
+
+    cfg: PIDControllerConfig: all the constants for a PID controller"""
+    self.Kp = cfg.Kp
+    self.Ki = cfg.Ki
+    self.Kd = cfg.Kd
+    self.delta_t = cfg.delta_t
+    self.setpoint = cfg.setpoint
+
+    self.cum_error = 0
+    self.prior_error = 0
+
+  def __call__(self, measurement: float, t: float=None) -> float:
+    """Implementing PID.
+
+    measurement: float: the current output of plant
+    t: float: time value (unused, the step is fixed by delta_t)"""
+    e = (self.setpoint-measurement)
+    self.cum_error += e*self.delta_t
+
+    p = self.Kp*e
+    i = self.Ki*self.cum_error
+    d = self.Kd*(e-self.prior_error)/self.delta_t
+
+    self.prior_error = e
+
+    return p+i+d
+
+
+class StateFeedbackRegulator:
+  def __init__(self,
+               K: ArrayLike,
+               k_f: float,
+               setpoint: Union[float, Callable]) -> None:
+    """Store K, k_f, and setpoint for use by the __call__ routine.
+
+    setpoint can be a constant (practicum 3/4) or a function of
+    time (honors)."""
+    self.k = K
+    self.k_f = k_f
+    self.setpoint = setpoint
+
+  def __call__(self, x: ArrayLike, t: float=0.0) -> float:
+    """Compute the state feedback regulator as discussed in class
+    Note: u should be a scalar since this is a single input system.
+
+    x: ArrayLike: current state
+    t: float: time value"""
+    r = self.setpoint(t) if callable(self.setpoint) else self.setpoint
+    return -1 * self.k @ x +self.k_f*r
+
+
+def feedforward_gain(K: ArrayLike,
+                     A: ArrayLike,
+                     B: ArrayLike,
+                     C: ArrayLike,
+                     debug: bool=False) -> float:
+  """Calculate the feedforward gain."""
+  denom_temp = (A-B@K)
+  if debug:
+    print(f"Feedforward (A-B@K):\n{denom_temp}")
+  denom_temp = np.linalg.inv(denom_temp)
+  if debug:
+    print(f"Feedforward inv(A-B@K):\n{denom_temp}")
+  denom_temp = C@denom_temp
+  if debug:
+    print(f"Feedforward C@denom_temp:\n{denom_temp}")
+  denom = denom_temp@B
+  if debug:
+    print(f"Feedforward gain step denom_temp@B:\n{denom}")
+  return -1/denom
@@ -0,0 +1,94 @@
+"""Discretization helpers for linear time-invariant systems.
+
+Both helpers return a (Phi, Gamma) pair so a continuous system
+x_dot = Ax + Bu with u held over each step becomes the recurrence
+x_k_1 = Phi x_k + Gamma u_k.
+"""
+
+import numpy as np
+from numpy.typing import ArrayLike
+from typing import Tuple
+
+
+def zoh(A: ArrayLike,
+        B: ArrayLike,
+        delta_t: float) -> Tuple[ArrayLike, ArrayLike]:
+  """Exact zero-order-hold discretization via one matrix exponential.
+
+  A: ArrayLike: n x n state matrix
+  B: ArrayLike: n x m input matrix
+  delta_t: float: time step
+
+  returns: Phi, Gamma"""
+  # scipy is heavy, only pay for it when a discretization is needed
+  from scipy.linalg import expm
+  A = np.atleast_2d(A)
+  n = A.shape[0]
+  B = np.reshape(B, (n, -1))
+  m = B.shape[1]
+
+  # expm([[A, B], [0, 0]]*dt) = [[Phi, Gamma], [0, I]]
+  block = np.zeros((n+m, n+m))
+  block[:n, :n] = A*delta_t
+  block[:n, n:] = B*delta_t
+  block = expm(block)
+  return block[:n, :n], block[:n, n:]
+
+def rk2_matrices(A: ArrayLike,
+                 B: ArrayLike,
+                 delta_t: float) -> Tuple[ArrayLike, ArrayLike]:
+  """The recurrence rk2_step produces on a linear system with held input.
+
+  A: ArrayLike: n x n state matrix
+  B: ArrayLike: n x m input matrix
+  delta_t: float: time step
+
+  returns: Phi, Gamma"""
+  A = np.atleast_2d(A)
+  n = A.shape[0]
+  B = np.reshape(B, (n, -1))
+
+  # f_1 = Ax+Bu, f_2 = A(x + dt/2 f_1) + Bu, x_k_1 = x + dt f_2
+  half = np.eye(n) + delta_t/2*A
+  return np.eye(n) + delta_t*A@half, delta_t*half@B
+
+def rk4_matrices(A: ArrayLike,
+                 B: ArrayLike,
+                 delta_t: float) -> Tuple[ArrayLike, ArrayLike]:
+  """The recurrence rk4_step produces on a linear system with held input.
+
+  A: ArrayLike: n x n state matrix
+  B: ArrayLike: n x m input matrix
+  delta_t: float: time step
+
+  returns: Phi, Gamma"""
+  A = np.atleast_2d(A)
+  n = A.shape[0]
+  B = np.reshape(B, (n, -1))
+
+  # Taylor series of expm(A dt) to 4th order, and of its integral to 3rd
+  hA = delta_t*A
+  term = np.eye(n)
+  phi = np.eye(n)
+  gamma = np.eye(n)
+  for k in range(1, 5):
+    term = term@hA/k
+    phi = phi + term
+    if k < 4:
+      gamma = gamma + term/(k + 1)
+  return phi, delta_t*gamma@B
+
+def euler_matrices(A: ArrayLike,
+                   B: ArrayLike,
+                   delta_t: float) -> Tuple[ArrayLike, ArrayLike]:
+  """The recurrence euler_step produces on a linear system with held input.
+
+  A: ArrayLike: n x n state matrix
+  B: ArrayLike: n x m input matrix
+  delta_t: float: time step
+
+  returns: Phi, Gamma"""
+  A = np.atleast_2d(A)
+  n = A.shape[0]
+  B = np.reshape(B, (n, -1))
+  return np.eye(n) + delta_t*A, delta_t*B
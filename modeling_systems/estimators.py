@@ -0,0 +1,27 @@
+"""Continuous-time state estimator from practicum 4."""
+
+import numpy as np
+from numpy.typing import ArrayLike
+
+
+class StateEstimator:
+  def __init__(self, plant, L: ArrayLike) -> None:
+    """Store the plant (e.g. a DCMotor instance) and the
+    estimate gain matrix, L as member variables
+
+    plant: plant to estimate the state of
+    L: ArrayLike: estimate gain matrix"""
+    self.plant = plant
+    self.L = np.reshape(L, (np.shape(L)[0], -1))
+
+  def __call__(self, xhat: ArrayLike, u: float, y: float) -> ArrayLike:
+    """Use the current state estimate, control signal, and measurement
+    to compute the estimate dynamics!
+
+    xhat: ArrayLike: xhat
+    u: ArrayLike: input (m,) or a float
+    y: ArrayLike: output (p,) or a float"""
+    A = self.plant.A
+    B = self.plant.B
+    C = self.plant.C
+    return A@xhat + B@np.atleast_1d(u) +self.L@(np.atleast_1d(y)-C@xhat)
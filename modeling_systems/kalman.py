@@ -0,0 +1,72 @@
+"""Steady-state discrete Kalman filter.
+
+An alternative to StateEstimator for noisy sensors. The DARE is solved
+once at construction and every gain the update needs is precomputed, so
+a step is just
+
+  xhat_k_1 = F xhat_k + G u_k + L y_k_1
+
+with F = Ad - L C Ad and G = Bd - L C Bd.
+"""
+
+import numpy as np
+from numpy.typing import ArrayLike
+
+from .discretize import zoh
+from .riccati import dare
+
+
+class SteadyStateKalmanFilter:
+  """Discrete steady-state Kalman filter for a continuous LTI plant."""
+  discrete = True
+
+  def __init__(self,
+               A: ArrayLike,
+               B: ArrayLike,
+               C: ArrayLike,
+               Q: ArrayLike,
+               R: ArrayLike,
+               delta_t: float) -> None:
+    """Discretize the plant, solve the DARE and precompute the gains.
+
+    A: ArrayLike: plant A matrix
+    B: ArrayLike: plant B matrix
+    C: ArrayLike: plant C matrix
+    Q: ArrayLike: process noise covariance (per step, on the state)
+    R: ArrayLike: measurement noise covariance
+    delta_t: float: time step the filter runs at"""
+    A = np.atleast_2d(np.asarray(A, dtype=float))
+    n = A.shape[0]
+    C = np.reshape(np.asarray(C, dtype=float), (-1, n))
+    Q = np.atleast_2d(np.asarray(Q, dtype=float))
+    R = np.atleast_2d(np.asarray(R, dtype=float))
+    self.Ad, self.Bd = zoh(A, B, delta_t)
+    self.C = C
+    self.delta_t = delta_t
+
+    # A priori steady-state error covariance and the Kalman gain
+    self.P = dare(self.Ad.T, C.T, Q, R)
+    S = C@self.P@C.T + R
+    self.L = np.linalg.solve(S, C@self.P).T
+
+    # Everything the update needs, transposed for row-vector states
+    I_LC = np.eye(n) - self.L@C
+    self.F = I_LC@self.Ad
+    self.G = I_LC@self.Bd
+    self._F_t = self.F.T
+    self._G_t = self.G.T
+    self._L_t = self.L.T
+
+  def __call__(self, xhat: ArrayLike, u: ArrayLike, y: ArrayLike) -> ArrayLike:
+    """Return the next state estimate from the current one, the input
+    held over the step and the measurement taken at the end of it.
+    Any leading dimensions of xhat are treated as a batch of filters.
+
+    xhat: ArrayLike: xhat (n,) or (N, n)
+    u: ArrayLike: input (m,) or (N, m)
+    y: ArrayLike: measurement (p,) or (N, p)"""
+    xhat = np.asarray(xhat, dtype=float)
+    batch = xhat.shape[:-1]
+    u = np.reshape(u, batch + (-1,))
+    y = np.reshape(y, batch + (-1,))
+    return xhat@self._F_t + u@self._G_t + y@self._L_t
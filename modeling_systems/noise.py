@@ -0,0 +1,93 @@
+"""Process and sensor noise drawn ahead of time in whole blocks.
+
+Calling the RNG once per step (like rand_xhat() does) costs far more than
+the draw itself, so NoiseBuffer pulls a (T, N, m) block of samples from a
+seeded numpy Generator and the simulation loop just indexes into it
+(the fast path reads a whole block of steps at once, noise[lo:hi]).
+"""
+
+import numpy as np
+from numpy.typing import ArrayLike
+from typing import Tuple
+from typing import Union
+
+
+def quantize(x: ArrayLike, step: float) -> ArrayLike:
+  """Round x to the nearest multiple of step, like an ADC/encoder would.
+
+  x: ArrayLike: signal to quantize
+  step: float: resolution of the sensor"""
+  return step*np.round(np.asarray(x)/step)
+
+
+class NoiseBuffer:
+  """Gaussian (and optionally quantization) noise, read step by step."""
+  def __init__(self,
+               cov: ArrayLike,
+               batch: Tuple[int, ...]=(),
+               quantization: float=0.0,
+               block: int=4096,
+               rng: Union[int, np.random.Generator]=None) -> None:
+    """Store the noise parameters and draw the first block.
+
+    Samples come from the generator in step order, so for a given seed
+    the noise is the same whatever the block size is.
+
+    cov: ArrayLike: m x m covariance (or a scalar variance for m = 1)
+    batch: Tuple[int, ...]: leading batch shape of every sample, e.g. (N,)
+    quantization: float: quantization step applied by apply(), 0 for none
+    block: int: number of steps drawn at a time
+    rng: int or np.random.Generator: seed or generator to draw from"""
+    cov = np.atleast_2d(np.asarray(cov, dtype=float))
+    # Symmetric square root, so singular covariances are fine too
+    w, v = np.linalg.eigh(cov)
+    self.sqrt_cov_t = (v*np.sqrt(np.clip(w, 0, None))).T
+    self.m = cov.shape[0]
+    self.batch = tuple(batch)
+    self.quantization = quantization
+    self.block = block
+    self.rng = np.random.default_rng(rng)
+    self.zero = not np.any(w > 0)
+
+    self._start = 0
+    self._samples = self._draw()
+
+  def _draw(self) -> ArrayLike:
+    """Draw the next (block, *batch, m) set of samples."""
+    shape = (self.block,) + self.batch + (self.m,)
+    if self.zero:
+      return np.zeros(shape)
+    return self.rng.standard_normal(shape)@self.sqrt_cov_t
+
+  def __getitem__(self, i: Union[int, slice]) -> ArrayLike:
+    """Return the (*batch, m) noise sample for step i, or the stacked
+    samples of a slice of steps. Steps must be read in increasing order.
+
+    i: int or slice: step index, or steps start:stop (no step size)"""
+    if isinstance(i, slice):
+      if i.step not in (None, 1) or i.start is None or i.stop is None:
+        raise IndexError("noise is read in contiguous start:stop slices")
+      parts = [np.zeros((0,) + self.batch + (self.m,))]
+      k = i.start
+      while k < i.stop:
+        self[k]
+        end = min(i.stop, self._start + self.block)
+        parts.append(self._samples[k - self._start:end - self._start])
+        k = end
+      return np.concatenate(parts)
+    if i < self._start:
+      raise IndexError(f"Step {i} was already discarded, noise is read forward only")
+    while i >= self._start + self.block:
+      self._start += self.block
+      self._samples = self._draw()
+    return self._samples[i - self._start]
+
+  def apply(self, signal: ArrayLike, i: int) -> ArrayLike:
+    """Add step i's noise to signal, then quantize it if configured.
+
+    signal: ArrayLike: clean signal, (*batch, m) or broadcastable to it
+    i: int: step index"""
+    noisy = np.asarray(signal) + self[i]
+    if self.quantization:
+      noisy = quantize(noisy, self.quantization)
+    return noisy
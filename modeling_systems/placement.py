@@ -0,0 +1,146 @@
+"""Pole placement for whole batches of candidate pole sets.
+
+Uses the eigenvector formulation behind KNV/Tits-Yang instead of
+Ackermann's formula. With B = [U0 U1][Z; 0], a closed-loop eigenvector x
+for the pole p has to lie in the null space of U1^T (A - pI), and once
+the eigenvectors X are picked
+
+  K = Z^-1 U0^T (A - X diag(p) X^-1)
+
+For single input plants each of those null spaces is one-dimensional,
+so X is unique and every pole set in a batch is solved at once. Multi
+input plants still need the Tits-Yang eigenvector iteration, which is
+done per pole set with scipy.signal.place_poles.
+
+Repeated poles have no full set of eigenvectors with a single input, so
+pole sets with repeated (or X too close to singular to trust) poles are
+solved with Ackermann's formula instead, like control.acker would.
+"""
+
+import logging
+import numpy as np
+from numpy.typing import ArrayLike
+
+logger = logging.getLogger(__name__)
+
+# Relative distance under which two poles of a set are the same pole
+_REPEATED = 1E-9
+# Condition number of X past which its pole set goes to Ackermann's formula
+_ILL_CONDITIONED = 1E8
+
+
+class PolePlacement:
+  """Place poles for a fixed (A, B), reusing its factorization."""
+  def __init__(self, A: ArrayLike, B: ArrayLike) -> None:
+    """Factor B and precompute the pieces every pole set needs.
+
+    A: ArrayLike: n x n state matrix
+    B: ArrayLike: n x m input matrix"""
+    self.A = np.atleast_2d(np.asarray(A, dtype=float))
+    n = self.A.shape[0]
+    self.B = np.reshape(np.asarray(B, dtype=float), (n, -1))
+    m = self.B.shape[1]
+    self.n = n
+    self.m = m
+
+    U, Z = np.linalg.qr(self.B, mode="complete")
+    if np.linalg.matrix_rank(Z[:m]) < m:
+      raise ValueError("B must have full column rank")
+    self.Z = Z[:m]
+    self.U0_t = U[:, :m].T
+    self.U1_t = U[:, m:].T
+    self.U1_t_A = self.U1_t@self.A
+
+  def __call__(self, poles: ArrayLike) -> ArrayLike:
+    """Return the gain(s) K that put the eigenvalues of A-BK at poles.
+
+    poles: ArrayLike: (n,) pole set, or (batch, n) stacked pole sets
+
+    returns: K as (m, n), or (batch, m, n)"""
+    poles = np.asarray(poles, dtype=complex)
+    single = poles.ndim == 1
+    poles = np.atleast_2d(poles)
+    if poles.shape[-1] != self.n:
+      raise ValueError(f"Expected {self.n} poles per set, got {poles.shape[-1]}")
+
+    if self.m == 1:
+      K = self._place_siso(poles)
+    else:
+      from scipy.signal import place_poles
+      K = np.stack([place_poles(self.A, self.B, p, method="YT").gain_matrix
+                    for p in poles])
+    return K[0] if single else K
+
+  def _place_siso(self, poles: ArrayLike) -> ArrayLike:
+    """Batched single input placement.
+
+    poles: ArrayLike: (batch, n) stacked pole sets"""
+    # A single input can't give a pole more than one eigenvector
+    ordered = np.sort_complex(poles)
+    repeated = np.isclose(ordered[:, 1:], ordered[:, :-1], rtol=_REPEATED, atol=0).any(axis=1)
+
+    # Eigenvector for every pole: null space of U1^T (A - pI)
+    M = self.U1_t_A[None, None] - poles[..., None, None]*self.U1_t[None, None]
+    if self.n > 1:
+      _, _, vh = np.linalg.svd(M)
+      X = vh[..., -1, :].conj()
+    else:
+      X = np.ones(poles.shape + (1,), dtype=complex)
+    # Rows of X are eigenvectors, so the batch of X matrices is X^T
+    X = np.swapaxes(X, -1, -2)
+    ackermann = repeated | ~(np.linalg.cond(X) < _ILL_CONDITIONED)
+    fine = ~ackermann
+
+    K = np.empty((len(poles), 1, self.n))
+    # A - BK = X diag(p) X^-1, solved as X^T (A-BK)^T = (X diag(p))^T
+    X = X[fine]
+    closed = np.swapaxes(np.linalg.solve(np.swapaxes(X, -1, -2),
+                                         np.swapaxes(X*poles[fine][:, None, :], -1, -2)), -1, -2)
+    K[fine] = np.linalg.solve(self.Z, self.U0_t@(self.A[None] - closed.real))
+    if ackermann.any():
+      K[ackermann] = self._ackermann(poles[ackermann])
+      failed = np.flatnonzero(ackermann)[np.isnan(K[ackermann]).any(axis=(1, 2))]
+      if len(failed):
+        logger.warning("(A, B) isn't controllable, pole sets %s can't be placed, "
+                       "their gains are NaN", failed.tolist())
+    return K
+
+  def _ackermann(self, poles: ArrayLike) -> ArrayLike:
+    """Single input placement by Ackermann's formula, for the pole sets
+    the eigenvectors can't handle: K = e_n^T C^-1 phi(A), with C the
+    controllability matrix and phi the characteristic polynomial.
+
+    poles: ArrayLike: (batch, n) stacked pole sets
+
+    returns: K as (batch, 1, n), NaN if (A, B) isn't controllable"""
+    powers = [np.eye(self.n)]
+    for _ in range(self.n):
+      powers.append(powers[-1]@self.A)
+    controllability = np.hstack([power@self.B for power in powers[:-1]])
+    if np.linalg.matrix_rank(controllability) < self.n:
+      return np.full((len(poles), 1, self.n), np.nan)
+    # e_n^T C^-1 A^k for k = 0..n
+    last = np.linalg.solve(controllability.T, np.eye(self.n)[-1])
+    rows = np.stack([last@power for power in powers])
+    coefficients = np.stack([np.poly(p).real for p in poles])
+    return (coefficients@rows[::-1])[:, None, :]
+
+
+def place(A: ArrayLike, B: ArrayLike, poles: ArrayLike) -> ArrayLike:
+  """Return K such that eig(A-BK) = poles, for one or many pole sets.
+
+  A: ArrayLike: n x n state matrix
+  B: ArrayLike: n x m input matrix
+  poles: ArrayLike: (n,) pole set, or (batch, n) stacked pole sets"""
+  return PolePlacement(A, B)(poles)
+
+def place_observer(A: ArrayLike, C: ArrayLike, poles: ArrayLike) -> ArrayLike:
+  """Return the estimate gain L such that eig(A-LC) = poles, the dual of
+  place(). Replaces acker(A.T, C.T, poles).T.
+
+  A: ArrayLike: n x n state matrix
+  C: ArrayLike: p x n output matrix
+  poles: ArrayLike: (n,) pole set, or (batch, n) stacked pole sets"""
+  A = np.atleast_2d(np.asarray(A, dtype=float))
+  C = np.reshape(np.asarray(C, dtype=float), (-1, A.shape[0]))
+  return np.swapaxes(place(A.T, C.T, poles), -1, -2)
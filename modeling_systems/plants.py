@@ -0,0 +1,279 @@
+"""Plants from the practicums: the RC circuit, the pendulum, the DC motor,
+the wheeled inverted pendulum (WIP) and the double inverted pendulum (DIP).
+
+Plant classes follow the simulate() protocol: 1-D states,
+dynamics(x, u) -> x_dot and output(x) -> y. The linear ones set
+linear = True and expose A, B and C (with C as a 2-D p x n matrix).
+states names the elements of x, for Trajectory's named columns.
+"""
+
+import math
+import numpy as np
+from numpy.typing import ArrayLike
+from dataclasses import dataclass
+
+
+def rc_dynamics(x: float, u: float) -> float:
+  """Return evaluation of f(x,u).
+  x: float : voltage output v_o
+  u: float : voltage input v_s"""
+  C = 1E-3
+  R = 2E3
+  return (u-x)/(C*R)
+
+def pendulum_dynamics(x: ArrayLike,
+                      u: float,
+                      m: float=0.5,
+                      l: float=0.2,
+                      b: float=1.0,
+                      g: float=9.8) -> ArrayLike:
+  """Pendulum dynamic equation that takes 2 dimensional array
+  as initial conditions. Given x1 and x2, return x1dot and x2dot.
+
+  x: ArrayLike: initial conditions
+  u: float: input torque
+  m: float: mass of pendulum
+  l: float: length of pendulum
+  b: float: damping coefficient of pendulum
+  g: float: gravity in m/s"""
+  theta = x[0]
+  theta_dot = x[1]
+
+  theta_d_dot = (u-b*theta_dot - m*g*l*math.sin(theta))
+  theta_d_dot *= 1/(m*l*l)
+
+  x_1_dot = theta_dot
+  x_2_dot = theta_d_dot
+  return np.array([x_1_dot, x_2_dot])
+
+
+class Pendulum:
+  """Damped pendulum from practicum 1 as a simulate() plant.
+  x = [theta, theta_dot], y = theta"""
+  linear = False
+  states = ("theta", "theta_dot")
+
+  def __init__(self,
+               m: float=0.5,
+               l: float=0.2,
+               b: float=1.0,
+               g: float=9.8) -> None:
+    """Store the pendulum constants.
+
+    m: float: mass of pendulum
+    l: float: length of pendulum
+    b: float: damping coefficient of pendulum
+    g: float: gravity in m/s"""
+    self.m = m
+    self.l = l
+    self.b = b
+    self.g = g
+
+  def dynamics(self, x: ArrayLike, u: float) -> ArrayLike:
+    """Return x_dot for input torque u.
+
+    x: ArrayLike: x
+    u: float: input torque"""
+    return pendulum_dynamics(x, u, m=self.m, l=self.l, b=self.b, g=self.g)
+
+  def output(self, x: ArrayLike) -> ArrayLike:
+    """Returns theta.
+
+    x: ArrayLike: x"""
+    return x[:1]
+
+
+@dataclass
+class DCMotorConfig:
+  """Store constant values for a DC Motor.
+
+  R: float: resistance (Ohms)
+  L: float: inductance (Henry)
+  b: float: dampening (Nms)
+  J: float: moment of inertia (kgm^2)
+  K_m: float: back emf constant
+  K_tau: float: motor torque constant"""
+  R: float
+  L: float
+  b: float
+  J: float
+  Km: float
+  Ktau: float
+
+
+class DCMotorDynamics:
+  """Dynamics for a DC motor."""
+  def __init__(self, motor_cfg: DCMotorConfig) -> None:
+    """Create A and B matrices from the motor_cfg.
+
+    motor_cfg: DCMotorConfig: dc motor config constants"""
+    self.A = np.array([[-1*motor_cfg.R/motor_cfg.L, 0, -1*motor_cfg.Km/motor_cfg.L],
+                       [0, 0, 1],
+                       [motor_cfg.Ktau/motor_cfg.J, 0, -1*motor_cfg.b/motor_cfg.J]])
+    self.B = np.array([[1/motor_cfg.L],
+                       [0],
+                       [0]])
+
+  def __call__(self, x: ArrayLike, u: float) -> ArrayLike:
+    """Perform xdot = Ax+Ub.
+
+    x: ArrayLike: x
+    u: ArrayLike: input (m,) or a float"""
+    a_term = self.A@x
+    b_term = self.B@np.atleast_1d(u)
+    return a_term + b_term
+
+
+class DCMotor:
+  """Wrapper that abstracts away DCMotorDynamics.
+  x = [i, theta, theta_dot], y = theta"""
+  linear = True
+  states = ("i", "theta", "theta_dot")
+
+  def __init__(self, cfg: DCMotorConfig) -> None:
+    """Inits dynamics.
+
+    cfg: DCMotorConfig: dc motor config constants"""
+    self.config = cfg
+    self.dynamics = DCMotorDynamics(cfg)
+    self.C = np.array([[0, 1, 0]])
+
+  @property
+  def A(self) -> ArrayLike:
+    """A matrix of the dynamics."""
+    return self.dynamics.A
+
+  @property
+  def B(self) -> ArrayLike:
+    """B matrix of the dynamics."""
+    return self.dynamics.B
+
+  def output(self, x: ArrayLike) -> ArrayLike:
+    """Returns theta.
+
+    x: ArrayLike: x"""
+    return self.C@x
+
+
+class WIP:
+  """Wheeled inverted pendulum.
+  x = [phi, phi_dot, theta_dot], y = theta_dot"""
+  linear = True
+  states = ("phi", "phi_dot", "theta_dot")
+
+  def __init__(self) -> None:
+    """Init A,B, and C arrays."""
+    self.A = self._init_A()
+    self.B = self._init_B()
+    self.C = self._init_C()
+
+  def _init_A(self) -> ArrayLike:
+    """Return A."""
+    A = np.array([
+      [0, 1, 0],
+      [29.77, -0.244, 0.284],
+      [-46.82, 1.242, -1.533],
+    ])
+    return A
+
+  def _init_B(self) -> ArrayLike:
+    """Return B."""
+    B = np.array([
+        [0],
+        [-7.714],
+        [39.22],
+    ])
+    return B
+
+  def _init_C(self) -> ArrayLike:
+    """Return C."""
+    C = np.array(
+        [[0, 0, 1]]
+    )
+    return C
+
+  def __str__(self) -> str:
+    """Return str in form of x_dot = Ax+B"""
+    top = "x_dot = Ax+B\n"
+    top+= f"A=\n{self.A}\nB=\n{self.B}\n"
+    bottom = "y = Cx\n"
+    bottom += f"C=\n{self.C}"
+    return (top + bottom)
+
+  def dynamics(self, x: ArrayLike, u: float) -> ArrayLike:
+    """Perform xdot = Ax+Ub.
+
+    x: ArrayLike: x
+    u: ArrayLike: input (m,) or a float"""
+    a_term = self.A@x
+    b_term = self.B@np.atleast_1d(u)
+    return a_term + b_term
+
+  def output(self, x: ArrayLike) -> ArrayLike:
+    """Returns theta dot.
+
+    x: ArrayLike: x"""
+    return self.C@x
+
+
+class DIP:
+  """Double inverted pendulum.
+  x = [alpha, gamma, alpha_dot, gamma_dot], y = gamma"""
+  linear = True
+  states = ("alpha", "gamma", "alpha_dot", "gamma_dot")
+
+  def __init__(self) -> None:
+    """Init A,B, and C arrays."""
+    self.A = self._init_A()
+    self.B = self._init_B()
+    self.C = self._init_C()
+
+  def _init_A(self) -> ArrayLike:
+    """Return A."""
+    A = np.array([
+      [0, 0, 1, 0],
+      [0, 0, 0, 1],
+      [-11.64, 1.034, -0.035, 0.031],
+      [35.68, 24.50, 0.031, -0.257],
+    ])
+    return A
+
+  def _init_B(self) -> ArrayLike:
+    """Return B."""
+    B = np.array([
+        [0],
+        [0],
+        [8.623],
+        [36.00],
+    ])
+    return B
+
+  def _init_C(self) -> ArrayLike:
+    """Return C."""
+    C = np.array(
+        [[0, 1, 0, 0]]
+    )
+    return C
+
+  def __str__(self) -> str:
+    """Return str in form of x_dot = Ax+B"""
+    top = "x_dot = Ax+B\n"
+    top+= f"A=\n{self.A}\nB=\n{self.B}\n"
+    bottom = "y = Cx\n"
+    bottom += f"C=\n{self.C}"
+    return (top + bottom)
+
+  def dynamics(self, x: ArrayLike, u: float) -> ArrayLike:
+    """Perform xdot = Ax+Ub.
+
+    x: ArrayLike: x
+    u: ArrayLike: input (m,) or a float"""
+    a_term = self.A@x
+    b_term = self.B@np.atleast_1d(u)
+    return a_term + b_term
+
+  def output(self, x: ArrayLike) -> ArrayLike:
+    """Returns gamma.
+
+    x: ArrayLike: x"""
+    return self.C@x
@@ -0,0 +1,282 @@
+"""Plotting long trajectories without handing matplotlib every sample.
+
+A line can't show more points than its axes have pixel columns, but
+matplotlib still transforms, clips and rasterizes every one of them, and
+a 10 s run at 1 ms is 10k points per line. Series are downsampled to
+about the pixel width of their axes first:
+
+  minmax    the min and the max of every bucket, in time order. Exact
+            envelope, so peaks, overshoot and noise bands all survive.
+            The default, it's a couple of vectorized reductions.
+  lttb      Largest-Triangle-Three-Buckets: per bucket, the sample that
+            makes the biggest triangle with the previous pick and the
+            next bucket's mean. Half the points for the same shape, but
+            each pick depends on the last one, so it costs a python loop
+            over the buckets.
+
+  plot_downsampled(ax, traj.t, traj.theta, label="theta")
+  plot_trajectory(traj, ("theta", "u"), path="run.png")
+
+Thousands of runs on one axes (Monte Carlo, batched simulate()) go
+through plot_overlay(): one LineCollection instead of a Line2D per run,
+or a density image once there are too many runs to tell apart.
+
+matplotlib is only imported by the functions that draw.
+"""
+
+import numpy as np
+from numpy.typing import ArrayLike
+from typing import Sequence, Tuple
+
+# Points per pixel column of the axes
+POINTS_PER_PIXEL = 2
+
+# Runs past which plot_overlay() draws a density image instead of lines
+DENSITY_ABOVE = 2000
+_DENSITY_CHUNK = 256
+
+
+def lttb_indices(x: ArrayLike, y: ArrayLike, points: int) -> np.ndarray:
+  """Indices of the samples Largest-Triangle-Three-Buckets keeps.
+
+  x: ArrayLike: (T,) increasing abscissa, e.g. time
+  y: ArrayLike: (T,) values
+  points: int: number of samples to keep, the first and last included
+
+  returns: (points,) increasing indices, or all of them if T <= points"""
+  x = np.asarray(x, dtype=float)
+  y = np.asarray(y, dtype=float)
+  n = len(y)
+  if points >= n or points < 3:
+    return np.arange(n)
+
+  # points-2 buckets over the samples between the first and the last
+  edges = np.linspace(1, n - 1, points - 1).astype(int)
+  lo, hi = edges[:-1], edges[1:]
+  sizes = hi - lo
+  # Mean of the next bucket, the last point after the last bucket
+  next_x = np.append(np.add.reduceat(x[:-1], lo)/sizes, x[-1])[1:]
+  next_y = np.append(np.add.reduceat(y[:-1], lo)/sizes, y[-1])[1:]
+
+  # Twice the area of the triangle (a, candidate, next bucket's mean) is
+  # |alpha x_a + beta y_a + gamma|, so only the pick a is left to the loop.
+  # Buckets are padded to the same size with zero area.
+  candidates = lo[:, None] + np.arange(sizes.max())
+  valid = candidates < hi[:, None]
+  candidates = np.where(valid, candidates, lo[:, None])
+  x_c, y_c = x[candidates], y[candidates]
+  alpha = np.where(valid, y_c - next_y[:, None], 0.0)
+  beta = np.where(valid, next_x[:, None] - x_c, 0.0)
+  gamma = np.where(valid, x_c*next_y[:, None] - next_x[:, None]*y_c, 0.0)
+
+  indices = np.empty(points, dtype=int)
+  indices[0], indices[-1] = 0, n - 1
+  x_a, y_a = x[0], y[0]
+  for k in range(points - 2):
+    a = candidates[k, np.argmax(np.abs(alpha[k]*x_a + beta[k]*y_a + gamma[k]))]
+    indices[k+1] = a
+    x_a, y_a = x[a], y[a]
+  return indices
+
+def _minmax_columns(y: np.ndarray, buckets: int) -> np.ndarray:
+  """Indices of the first and last sample and of the min and max of
+  every bucket, per column of a (T, N) y.
+
+  returns: (2*buckets + 2, N) indices, increasing down each column"""
+  n = len(y)
+  size = -(-n//buckets)
+  # Pad with the last row, so every bucket is size long
+  padded = np.concatenate((y, np.repeat(y[-1:], size*buckets - n, axis=0)))
+  rows = padded.reshape(buckets, size, -1)
+  offsets = (np.arange(buckets)*size)[:, None]
+  ends = np.repeat([[0], [n - 1]], y.shape[1], axis=1)
+  picks = np.concatenate((ends,
+                          offsets + np.argmin(rows, axis=1),
+                          offsets + np.argmax(rows, axis=1)))
+  return np.sort(np.minimum(picks, n - 1), axis=0)
+
+def minmax_indices(y: ArrayLike, buckets: int) -> np.ndarray:
+  """Indices of the min and max of every bucket, plus the first and the
+  last sample.
+
+  y: ArrayLike: (T,) values
+  buckets: int: number of buckets, so up to 2*buckets + 2 samples kept
+
+  returns: increasing indices, or all of them if T <= 2*buckets"""
+  y = np.asarray(y, dtype=float)
+  n = len(y)
+  if 2*buckets >= n or buckets < 1:
+    return np.arange(n)
+  return np.unique(_minmax_columns(y[:, None], buckets))
+
+def downsample(x: ArrayLike, y: ArrayLike, points: int, method: str="minmax"):
+  """Downsampled copy of a series.
+
+  x: ArrayLike: (T,) abscissa
+  y: ArrayLike: (T,) values
+  points: int: about how many samples to keep
+  method: str: "minmax" or "lttb"
+
+  returns: x and y at the kept samples"""
+  if method == "minmax":
+    indices = minmax_indices(y, max(points//2 - 1, 1))
+  elif method == "lttb":
+    indices = lttb_indices(x, y, points)
+  else:
+    raise ValueError(f"unknown method {method!r}, expected 'minmax' or 'lttb'")
+  return np.asarray(x)[indices], np.asarray(y)[indices]
+
+def _pixel_width(ax) -> int:
+  """Width of the axes on the figure, in pixels."""
+  return max(int(ax.get_window_extent().width), 1)
+
+def _pixel_height(ax) -> int:
+  """Height of the axes on the figure, in pixels."""
+  return max(int(ax.get_window_extent().height), 1)
+
+def plot_downsampled(ax, x: ArrayLike, y: ArrayLike, points: int=None,
+                     method: str="minmax", **kwargs) -> list:
+  """ax.plot(x, y) with every line downsampled first.
+
+  ax: matplotlib axes to draw on
+  x: ArrayLike: (T,) abscissa
+  y: ArrayLike: (T,) or (T, k) values, one line per column
+  points: int: samples kept per line, POINTS_PER_PIXEL per pixel column
+    of ax by default
+  method: str: "minmax" or "lttb"
+  kwargs: passed on to ax.plot
+
+  returns: the Line2D objects"""
+  if points is None:
+    points = POINTS_PER_PIXEL*_pixel_width(ax)
+  y = np.asarray(y)
+  columns = y.reshape(len(y), -1)
+  lines = []
+  for k in range(columns.shape[1]):
+    x_k, y_k = downsample(x, columns[:, k], points, method)
+    lines += ax.plot(x_k, y_k, **kwargs)
+  return lines
+
+def plot_trajectory(traj,
+                    signals: Sequence[str]=None,
+                    path: str=None,
+                    method: str="minmax",
+                    figsize: tuple=None):
+  """One axes per signal of a Trajectory, against time, downsampled.
+
+  traj: Trajectory: result of simulate()
+  signals: Sequence[str]: names of states, logs or derived signals
+    ("theta", "u", "y", ...), all of the plant's states by default
+  path: str: save the figure here too
+  method: str: "minmax" or "lttb"
+  figsize: tuple: figure size, 3 inches of height per signal by default
+
+  returns: the figure"""
+  # matplotlib is heavy, only pay for it when a plot is asked for
+  import matplotlib.pyplot as plt
+  if signals is None:
+    signals = traj.states
+  fig, axs = plt.subplots(len(signals), 1, sharex=True, squeeze=False,
+                          figsize=figsize or (8, 3*len(signals)))
+  for ax, name in zip(axs[:, 0], signals):
+    plot_downsampled(ax, traj.t, getattr(traj, name), method=method)
+    ax.set_ylabel(name)
+    ax.grid(visible=True, which='major', color='#AAAAAA', linewidth=1.0)
+  axs[-1, 0].set_xlabel("Time $(s)$")
+  fig.tight_layout()
+  if path is not None:
+    fig.savefig(path)
+  return fig
+
+def _density(t: np.ndarray, runs: np.ndarray, width: int, height: int,
+             color_by: np.ndarray=None) -> Tuple[np.ndarray, tuple]:
+  """Samples per pixel of the runs, or with color_by the mean metric of
+  the runs through each pixel.
+
+  returns: (width, height) image, NaN where no run goes, and its extent"""
+  lo, hi = np.nanmin(runs), np.nanmax(runs)
+  if not hi > lo:
+    lo, hi = lo - 0.5, lo + 0.5
+  span = t[-1] - t[0] if t[-1] > t[0] else 1.0
+  columns = np.minimum(((t - t[0])/span*width).astype(int), width - 1)[:, None]
+  counts = np.zeros(width*height)
+  sums = np.zeros(width*height)
+  # A few hundred runs at a time, the bin indices of all of them at once
+  # would be as big as the runs
+  for k in range(0, runs.shape[1], _DENSITY_CHUNK):
+    chunk = runs[:, k:k+_DENSITY_CHUNK]
+    finite = np.isfinite(chunk)
+    rows = np.minimum(((chunk - lo)/(hi - lo)*height).astype(int), height - 1)
+    bins = (columns*height + rows)[finite]
+    counts += np.bincount(bins, minlength=width*height)
+    if color_by is not None:
+      weights = np.broadcast_to(color_by[k:k+_DENSITY_CHUNK], chunk.shape)[finite]
+      sums += np.bincount(bins, weights=weights, minlength=width*height)
+  with np.errstate(invalid="ignore", divide="ignore"):
+    image = sums/counts if color_by is not None else np.log(counts)
+  image[counts == 0] = np.nan
+  return image.reshape(width, height), (t[0], t[-1], lo, hi)
+
+def plot_overlay(ax, t: ArrayLike, runs: ArrayLike, color_by: ArrayLike=None,
+                 cmap: str="viridis", density_above: int=DENSITY_ABOVE,
+                 points: int=None, **kwargs):
+  """Many runs of one signal on one axes, e.g. Monte Carlo estimator
+  starts.
+
+  Up to density_above runs go into a single LineCollection, each run
+  min/max downsampled to about one point per pixel column. Past that,
+  individual lines are noise anyway, and the runs are binned into an
+  image of the axes' pixel size instead: log samples per pixel, or with
+  color_by the mean metric of the runs through each pixel. The image is
+  built from the samples, so a run that jumps several pixels in one step
+  only marks its ends.
+
+  ax: matplotlib axes to draw on
+  t: ArrayLike: (T,) time
+  runs: ArrayLike: (T, N) one run per column, e.g. traj.theta of a
+    batched simulate()
+  color_by: ArrayLike: (N,) metric of every run (cost, settling time,
+    ...) mapped through cmap, None to draw every run alike
+  cmap: str: colormap for color_by and the density image
+  density_above: int: number of runs past which to draw the image
+  points: int: samples kept per run, one per pixel column of ax by
+    default
+  kwargs: passed on to the LineCollection (color, linewidths, alpha) or
+    to imshow
+
+  returns: the LineCollection or the image, for fig.colorbar()"""
+  t = np.asarray(t, dtype=float)
+  runs = np.asarray(runs, dtype=float)
+  runs = runs.reshape(len(runs), -1)
+  n_runs = runs.shape[1]
+  if color_by is not None:
+    color_by = np.ravel(np.asarray(color_by, dtype=float))
+    if len(color_by) != n_runs:
+      raise ValueError(f"color_by has {len(color_by)} values for {n_runs} runs")
+
+  if n_runs > density_above:
+    image, extent = _density(t, runs, _pixel_width(ax), _pixel_height(ax), color_by)
+    kwargs.setdefault("interpolation", "nearest")
+    return ax.imshow(image.T, origin="lower", extent=extent, aspect="auto",
+                     cmap=cmap, **kwargs)
+
+  # matplotlib is heavy, only pay for it when a plot is asked for
+  from matplotlib.collections import LineCollection
+  if points is None:
+    points = _pixel_width(ax)
+  buckets = max(points//2 - 1, 1)
+  if 2*buckets < len(t):
+    indices = _minmax_columns(runs, buckets)
+    segments = np.stack((t[indices], np.take_along_axis(runs, indices, axis=0)), axis=-1)
+  else:
+    segments = np.stack(np.broadcast_arrays(t[:, None], runs), axis=-1)
+  kwargs.setdefault("linewidths", 0.75)
+  # Dense bundles read as density rather than a solid block
+  kwargs.setdefault("alpha", min(1.0, 10/np.sqrt(n_runs)))
+  lines = LineCollection(segments.transpose(1, 0, 2), **kwargs)
+  if color_by is not None:
+    lines.set_array(color_by)
+    lines.set_cmap(cmap)
+  ax.add_collection(lines, autolim=True)
+  ax.autoscale_view()
+  return lines
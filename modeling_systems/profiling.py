@@ -0,0 +1,182 @@
+"""Opt-in per-phase profiling of simulate().
+
+Pass a Profiler as simulate(..., profiler=profiler) and the loop's
+callables (controller, plant dynamics, estimator, steppers, measurement)
+get wrapped in timers before the loop starts, so a run without one pays
+nothing. Phases nest with ";" the way collapsed stacks do, e.g.
+"plant_step;dynamics" is the time inside plant.dynamics spent under the
+plant's stepper, and whatever the loop spends outside every phase is
+reported as its own self time (array bookkeeping, noise, logging).
+
+  profiler = Profiler(alloc_every=100)
+  simulate(plant, controller, x_0, 0, 10, 1E-3, profiler=profiler)
+  profiler.report()["phases"]["controller"]["ns_per_call"]
+  profiler.write_collapsed("simulate.folded")  # flamegraph.pl / speedscope
+"""
+
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Callable
+
+
+class _Phase:
+  """Cumulative timer, call counter and sampled allocation counter."""
+  def __init__(self) -> None:
+    self.ns = 0
+    self.calls = 0
+    self.timed = 0
+    self.alloc_bytes = 0
+    self.alloc_blocks = 0
+    self.samples = 0
+
+  def seconds(self) -> float:
+    """Total time, with the sampled (untimed) calls at the mean rate."""
+    if self.timed == 0:
+      return 0.0
+    return self.ns*self.calls/self.timed*1E-9
+
+
+class _Timed:
+  """Callable wrapper that times every call into a _Phase."""
+  def __init__(self, func: Callable, phase: _Phase, alloc_every: int) -> None:
+    self.func = func
+    self.phase = phase
+    self.alloc_every = alloc_every
+
+  def __call__(self, *args, **kwargs):
+    phase = self.phase
+    phase.calls += 1
+    if self.alloc_every and phase.calls % self.alloc_every == 0:
+      return self._sample(*args, **kwargs)
+    start = time.perf_counter_ns()
+    out = self.func(*args, **kwargs)
+    phase.ns += time.perf_counter_ns() - start
+    phase.timed += 1
+    return out
+
+  def _sample(self, *args, **kwargs):
+    """Run one call under tracemalloc. It's left out of the timings, since
+    tracing makes every allocation several times slower."""
+    phase = self.phase
+    was_tracing = tracemalloc.is_tracing()
+    if not was_tracing:
+      tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+    snapshot = tracemalloc.take_snapshot() if not was_tracing else None
+    out = self.func(*args, **kwargs)
+    _, peak = tracemalloc.get_traced_memory()
+    if snapshot is not None:
+      # Blocks the call allocated that are still alive, not counting the
+      # first snapshot itself
+      ignore = [tracemalloc.Filter(False, tracemalloc.__file__)]
+      after = tracemalloc.take_snapshot().filter_traces(ignore)
+      phase.alloc_blocks += sum(stat.count_diff for stat in
+                                after.compare_to(snapshot.filter_traces(ignore), "filename")
+                                if stat.count_diff > 0)
+      tracemalloc.stop()
+    phase.alloc_bytes += peak - before
+    phase.samples += 1
+    return out
+
+
+class Profiler:
+  """Collects per-phase timings across one or more simulate() runs."""
+  def __init__(self, alloc_every: int=0) -> None:
+    """Set up an empty profile.
+
+    alloc_every: int: trace every alloc_every-th call of each phase with
+      tracemalloc, 0 to skip allocation sampling"""
+    self.alloc_every = alloc_every
+    self.phases = {}
+    self.runs = {}
+    self.steps = 0
+    self.total_ns = 0
+
+  def _phase(self, name: str) -> _Phase:
+    if name not in self.phases:
+      self.phases[name] = _Phase()
+    return self.phases[name]
+
+  def wrap(self, name: str, func: Callable) -> Callable:
+    """Return func timed as phase name.
+
+    name: str: phase name, ";" separated for nested phases
+    func: Callable: callable to time"""
+    return _Timed(func, self._phase(name), self.alloc_every)
+
+  @contextmanager
+  def phase(self, name: str):
+    """Time a block of code as phase name (for coarse, one-off phases)."""
+    phase = self._phase(name)
+    phase.calls += 1
+    start = time.perf_counter_ns()
+    try:
+      yield
+    finally:
+      phase.ns += time.perf_counter_ns() - start
+      phase.timed += 1
+
+  @contextmanager
+  def run(self, path: str, steps: int):
+    """Time a whole simulate() call.
+
+    path: str: which code path simulate() took
+    steps: int: number of steps it simulates"""
+    self.runs[path] = self.runs.get(path, 0) + 1
+    self.steps += steps
+    start = time.perf_counter_ns()
+    try:
+      yield
+    finally:
+      self.total_ns += time.perf_counter_ns() - start
+
+  def _self_seconds(self) -> dict:
+    """Time of each phase minus the time of the phases nested in it, plus
+    "" for the time outside every phase."""
+    totals = {name: phase.seconds() for name, phase in self.phases.items()}
+    totals[""] = self.total_ns*1E-9
+    self_seconds = dict(totals)
+    for name in self.phases:
+      parent = name.rpartition(";")[0]
+      self_seconds[parent] -= totals[name]
+    return self_seconds
+
+  def report(self) -> dict:
+    """Structured summary of everything profiled so far.
+
+    returns: {"runs", "steps", "total_seconds", "self_seconds",
+      "phases": {name: {"seconds", "self_seconds", "calls",
+      "ns_per_call", and with allocation sampling "alloc_samples",
+      "alloc_peak_bytes_per_call", "alloc_blocks_per_call"}}}"""
+    self_seconds = self._self_seconds()
+    phases = {}
+    for name, phase in self.phases.items():
+      seconds = phase.seconds()
+      entry = {"seconds": seconds,
+               "self_seconds": self_seconds[name],
+               "calls": phase.calls,
+               "ns_per_call": seconds/phase.calls*1E9 if phase.calls else 0.0}
+      if phase.samples:
+        entry["alloc_samples"] = phase.samples
+        entry["alloc_peak_bytes_per_call"] = phase.alloc_bytes/phase.samples
+        entry["alloc_blocks_per_call"] = phase.alloc_blocks/phase.samples
+      phases[name] = entry
+    return {"runs": dict(self.runs),
+            "steps": self.steps,
+            "total_seconds": self.total_ns*1E-9,
+            "self_seconds": self_seconds[""],
+            "phases": phases}
+
+  def write_collapsed(self, path: str, root: str="simulate") -> None:
+    """Write the self time of every phase, in microseconds, as collapsed
+    stacks ("root;phase;subphase value" per line), the input format of
+    flamegraph.pl and speedscope.
+
+    path: str: file to write
+    root: str: name of the bottom frame"""
+    with open(path, "w") as f:
+      for name, seconds in sorted(self._self_seconds().items()):
+        stack = f"{root};{name}" if name else root
+        f.write(f"{stack} {max(int(round(seconds*1E6)), 0)}\n")
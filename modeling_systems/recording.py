@@ -0,0 +1,86 @@
+"""What simulate() keeps of a run.
+
+By default every log keeps every sample. A Recording passed as
+simulate(..., record=...) thins that out while the integration itself
+still runs at delta_t:
+
+  every=k       keep every k-th sample (t[::k])
+  states=[1]    keep only these columns of x (and xhat)
+  envelope=True keep the min and max over each window of k samples
+                instead, as [:, 0] and [:, 1] of every log (t is the
+                start of each window)
+
+Only the logs asked for in outputs are recorded at all. The engine hands
+the recorder fixed-size blocks of full-rate samples, so the memory a run
+needs is its recorded logs plus one block.
+"""
+
+import numpy as np
+from dataclasses import dataclass
+from typing import Sequence
+
+
+@dataclass
+class Recording:
+  """What to keep of a run.
+
+  every: int: keep every k-th sample, or with envelope the window size
+  states: Sequence[int]: columns of x (and xhat) to keep, None for all
+  envelope: bool: keep per-window min/max instead of samples"""
+  every: int = 1
+  states: Sequence[int] = None
+  envelope: bool = False
+
+  def __post_init__(self) -> None:
+    if int(self.every) != self.every or self.every < 1:
+      raise ValueError(f"every must be a positive integer, got {self.every!r}")
+    self.every = int(self.every)
+
+
+class Recorder:
+  """Collects the logs of one run a block of samples at a time."""
+  def __init__(self, recording: Recording, length: int, block: int) -> None:
+    """Size the recorded logs.
+
+    recording: Recording: what to keep, None to keep everything
+    length: int: number of samples in the full run
+    block: int: roughly how many samples the engine hands over at once"""
+    self.recording = recording if recording is not None else Recording()
+    every = self.recording.every
+    self.size = -(-length//every)
+    # Whole windows per block, so windows never straddle two blocks
+    self.block = every*max(-(-block//every), 1)
+    self.recorded = 0
+    self.logs = {}
+
+  def add(self, rows: dict, start: int, count: int) -> None:
+    """Record count consecutive samples.
+
+    rows: dict: log name -> (>= count, ...) full-rate samples
+    start: int: index of the first sample in the run, a multiple of
+      the block size
+    count: int: number of samples"""
+    recording = self.recording
+    every = recording.every
+    first = start//every
+    windows = -(-count//every)
+    for name, values in rows.items():
+      values = values[:count]
+      if recording.states is not None and name in ("x", "xhat"):
+        values = values[..., recording.states]
+      if name not in self.logs:
+        shape = (self.size,) + ((2,) if recording.envelope else ()) + values.shape[1:]
+        self.logs[name] = np.zeros(shape)
+      out = self.logs[name]
+      if recording.envelope:
+        edges = np.arange(0, count, every)
+        out[first:first+windows, 0] = np.minimum.reduceat(values, edges, axis=0)
+        out[first:first+windows, 1] = np.maximum.reduceat(values, edges, axis=0)
+      else:
+        out[first:first+windows] = values[::every]
+    self.recorded = first + windows
+
+  def result(self) -> dict:
+    """The recorded logs, cut to what was recorded if the run stopped
+    early."""
+    return {name: values[:self.recorded] for name, values in self.logs.items()}
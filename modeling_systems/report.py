@@ -0,0 +1,218 @@
+"""Report pages for sweeps, rendered headless across processes.
+
+A page is one figure per result, one axes per signal:
+
+  runs = {f"Kp={Kp}": simulate(...) for Kp in gains}
+  render_report(runs, "report/", PlotSpec(("theta", "u")), formats=("png", "svg"))
+
+Pages are drawn on Agg canvases directly (no pyplot, no GUI backend, so
+this is safe from a notebook too), and every page with the same PlotSpec
+reuses one figure: the axes, labels, grid and layout are built once per
+worker, each page only swaps the line data in. With limits shared
+across the pages (the default) the axes are even drawn once, and a PNG
+page is that background with its lines and title blitted on top. Series
+are downsampled (see plotting.py) in this process before being shipped,
+so workers get a few thousand points per line whatever the length of
+the runs.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from dataclasses import dataclass, replace
+from typing import List, Mapping, Sequence, Tuple, Union
+
+from .plotting import POINTS_PER_PIXEL, downsample
+
+# Pages handed to a worker at once, per worker
+_CHUNKS_PER_WORKER = 4
+
+
+@dataclass(frozen=True)
+class PlotSpec:
+  """Layout of a report page.
+
+  signals: Sequence[str]: one axes per signal, any name a Trajectory
+    answers to ("theta", "u", "y", "error", ...), the plant's states by
+    default
+  title: str: page title, formatted with the result's name
+  figsize: tuple: figure size, 2.5 inches of height per signal by default
+  method: str: downsampling, "minmax" or "lttb"
+  dpi: int: raster resolution
+  shared_limits: bool: the same axis limits on every page of the spec,
+    so the pages of a sweep compare at a glance (and PNG pages only
+    draw their lines), False to fit each page"""
+  signals: Sequence[str] = None
+  title: str = "{name}"
+  figsize: tuple = None
+  method: str = "minmax"
+  dpi: int = 100
+  shared_limits: bool = True
+
+  def __post_init__(self) -> None:
+    # Tuples, so specs hash and pages can share a template
+    if self.signals is not None:
+      object.__setattr__(self, "signals", tuple(self.signals))
+    if self.figsize is not None:
+      object.__setattr__(self, "figsize", tuple(self.figsize))
+
+  @property
+  def size(self) -> Tuple[float, float]:
+    return self.figsize or (8, 2.5*len(self.signals))
+
+
+def _series(traj, spec: PlotSpec) -> list:
+  """Downsampled (t, columns) of every signal of a page."""
+  points = POINTS_PER_PIXEL*int(spec.size[0]*spec.dpi)
+  series = []
+  for name in spec.signals:
+    y = np.asarray(getattr(traj, name))
+    columns = y.reshape(len(y), -1)
+    series.append([downsample(traj.t, columns[:, k], points, spec.method)
+                   for k in range(columns.shape[1])])
+  return series
+
+class _Template:
+  """Figure of a spec, laid out once and reused for every page."""
+  def __init__(self, spec: PlotSpec, limits: tuple) -> None:
+    """Build the empty page.
+
+    spec: PlotSpec: layout
+    limits: tuple: ((x_lo, y_lo), (x_hi, y_hi)) of every signal, None to
+      fit the limits to each page"""
+    # matplotlib is heavy, only pay for it when a plot is asked for
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    self.spec = spec
+    self.fig = Figure(figsize=spec.size, dpi=spec.dpi)
+    FigureCanvasAgg(self.fig)
+    self.axs = self.fig.subplots(len(spec.signals), 1, sharex=True, squeeze=False)[:, 0]
+    for ax, name in zip(self.axs, spec.signals):
+      ax.set_ylabel(name)
+      ax.grid(visible=True, which='major', color='#AAAAAA', linewidth=1.0)
+    self.axs[-1].set_xlabel("Time $(s)$")
+    self.title = self.fig.suptitle(" ")
+    self.fig.tight_layout()
+    self.title.set_text("")
+
+    self.background = None
+    if limits is not None:
+      for ax, corners in zip(self.axs, limits):
+        ax.update_datalim(corners)
+        ax.autoscale_view()
+        ax.set_autoscale_on(False)
+      # Everything but the lines and the title, blitted under every page
+      self.fig.canvas.draw()
+      self.background = self.fig.canvas.copy_from_bbox(self.fig.bbox)
+
+  def _set_lines(self, series: list) -> None:
+    """Reuse the lines of the last page, adding or dropping the difference."""
+    for ax, lines in zip(self.axs, series):
+      old = ax.get_lines()
+      for line, (x, y) in zip(old, lines):
+        line.set_data(x, y)
+      for line in old[len(lines):]:
+        line.remove()
+      for x, y in lines[len(old):]:
+        ax.plot(x, y)
+      if self.background is None:
+        ax.relim()
+        ax.autoscale_view()
+
+  def _blit_png(self, path: str) -> None:
+    """Save the page as PNG, drawing only the lines and the title."""
+    from PIL import Image
+    canvas = self.fig.canvas
+    canvas.restore_region(self.background)
+    for ax in self.axs:
+      for line in ax.get_lines():
+        ax.draw_artist(line)
+    self.fig.draw_artist(self.title)
+    # Pages are opaque, so RGB, and zlib's fastest level: encoding is most
+    # of a page's time, this halves it for ~10% bigger files
+    rgb = np.asarray(canvas.buffer_rgba())[..., :3]
+    Image.fromarray(rgb).save(path, format="png", compress_level=1,
+                              dpi=(self.spec.dpi, self.spec.dpi))
+
+  def render(self, name: str, series: list, directory: str, formats: Sequence[str]) -> List[str]:
+    """Draw one page and save it in every format."""
+    self.title.set_text(self.spec.title.format(name=name))
+    self._set_lines(series)
+    paths = []
+    for fmt in formats:
+      path = os.path.join(directory, f"{name}.{fmt}")
+      if fmt == "png" and self.background is not None:
+        self._blit_png(path)
+      else:
+        self.fig.savefig(path, format=fmt)
+      paths.append(path)
+    return paths
+
+
+def _render_pages(pages: list, directory: str, formats: Sequence[str]) -> List[str]:
+  """Draw and save pages, module level so worker processes can pickle it.
+
+  pages: list: (name, spec, limits, series) of every page"""
+  templates = {}
+  paths = []
+  for name, spec, limits, series in pages:
+    if (spec, limits) not in templates:
+      templates[spec, limits] = _Template(spec, limits)
+    paths += templates[spec, limits].render(name, series, directory, formats)
+  return paths
+
+def _limits(pages: list) -> tuple:
+  """Corners of the data of every signal, over the series of all pages."""
+  limits = []
+  for k in range(len(pages[0])):
+    x = np.concatenate([x for series in pages for x, _ in series[k]])
+    y = np.concatenate([y for series in pages for _, y in series[k]])
+    limits.append(((np.nanmin(x), np.nanmin(y)), (np.nanmax(x), np.nanmax(y))))
+  return tuple(limits)
+
+def render_report(results: Union[Mapping, Sequence],
+                  directory: str,
+                  spec: Union[PlotSpec, Sequence[PlotSpec]]=None,
+                  formats: Sequence[str]=("png",),
+                  workers: int=None) -> List[str]:
+  """Render one page per result.
+
+  results: Mapping or Sequence: Trajectory results, by page name (a
+    sequence is named run000, run001, ...)
+  directory: str: where the pages go, created if missing
+  spec: PlotSpec or Sequence[PlotSpec]: layout of every page, or one per
+    result, a default PlotSpec if None
+  formats: Sequence[str]: file formats every page is saved in ("png",
+    "svg", "pdf")
+  workers: int: worker processes, defaults to the number of CPUs, 1
+    renders everything in this process
+
+  returns: paths of the files written, page by page"""
+  if not isinstance(results, Mapping):
+    results = {f"run{i:03d}": traj for i, traj in enumerate(results)}
+  specs = spec if isinstance(spec, Sequence) else [spec]*len(results)
+  if len(specs) != len(results):
+    raise ValueError(f"{len(specs)} specs for {len(results)} results")
+  os.makedirs(directory, exist_ok=True)
+
+  named = []
+  for (name, traj), spec in zip(results.items(), specs):
+    spec = spec if spec is not None else PlotSpec()
+    if spec.signals is None:
+      spec = replace(spec, signals=traj.states)
+    named.append((name, spec, _series(traj, spec)))
+  shared = dict.fromkeys(spec for _, spec, _ in named if spec.shared_limits)
+  limits = {spec: _limits([series for _, other, series in named if other == spec])
+            for spec in shared}
+  pages = [(name, spec, limits.get(spec), series) for name, spec, series in named]
+
+  if workers is None:
+    workers = os.cpu_count() or 1
+  workers = max(min(workers, len(pages)), 1)
+  if workers == 1:
+    return _render_pages(pages, directory, formats)
+  size = -(-len(pages)//(_CHUNKS_PER_WORKER*workers))
+  chunks = [pages[i:i+size] for i in range(0, len(pages), size)]
+  with ProcessPoolExecutor(max_workers=workers) as pool:
+    futures = [pool.submit(_render_pages, chunk, directory, formats) for chunk in chunks]
+    return [path for future in futures for path in future.result()]
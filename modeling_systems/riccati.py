@@ -0,0 +1,132 @@
+"""Continuous and discrete algebraic Riccati equations and LQR design.
+
+NumPy/SciPy only, so designing gains doesn't need the python-control
+import. Both solvers use the Schur method: the stabilizing solution
+comes from the stable invariant (or deflating) subspace of the
+Hamiltonian matrix (or symplectic pencil). Q and R may be stacked to
+solve a whole batch of weightings for the same plant. scipy.linalg is
+only imported once a solver actually runs.
+"""
+
+import numpy as np
+from numpy.typing import ArrayLike
+from typing import Tuple
+
+# Relative distance from the unit circle under which a pencil eigenvalue
+# counts as on it
+_UNIT_CIRCLE = np.sqrt(np.finfo(float).eps)
+
+
+def _weights(A: ArrayLike,
+             B: ArrayLike,
+             Q: ArrayLike,
+             R: ArrayLike) -> Tuple[ArrayLike, ArrayLike, ArrayLike, ArrayLike, bool]:
+  """Return A, B and (batch, n, n) / (batch, m, m) stacks of Q and R,
+  plus whether the caller passed a batch."""
+  A = np.atleast_2d(np.asarray(A, dtype=float))
+  n = A.shape[0]
+  B = np.reshape(np.asarray(B, dtype=float), (n, -1))
+  m = B.shape[1]
+  Q = np.asarray(Q, dtype=float)
+  R = np.asarray(R, dtype=float)
+  batched = Q.ndim == 3 or R.ndim == 3
+  Q = np.reshape(Q, (-1, n, n))
+  R = np.reshape(R, (-1, m, m))
+  batch = max(Q.shape[0], R.shape[0])
+  Q = np.broadcast_to(Q, (batch, n, n))
+  R = np.broadcast_to(R, (batch, m, m))
+  return A, B, Q, R, batched
+
+def _stable_solution(U: ArrayLike, n: int) -> ArrayLike:
+  """X = U21 U11^-1 from the basis of the stable subspace, symmetrized."""
+  # A singular U11 means there is no stabilizing solution, rather than
+  # whatever the solve happens to make of it
+  if np.linalg.cond(U[:n, :n]) > 1/np.finfo(float).eps:
+    raise np.linalg.LinAlgError("no stabilizing solution, (A, B) isn't stabilizable")
+  X = np.linalg.solve(U[:n, :n].T, U[n:, :n].T).T
+  return (X + X.T)/2
+
+def care(A: ArrayLike, B: ArrayLike, Q: ArrayLike, R: ArrayLike) -> ArrayLike:
+  """Solve A^T S + S A - S B R^-1 B^T S + Q = 0.
+
+  A: ArrayLike: n x n state matrix
+  B: ArrayLike: n x m input matrix
+  Q: ArrayLike: n x n state penalty, or (batch, n, n)
+  R: ArrayLike: m x m input penalty (or a scalar), or (batch, m, m)"""
+  from scipy.linalg import schur
+  A, B, Q, R, batched = _weights(A, B, Q, R)
+  n = A.shape[0]
+  S = np.empty(Q.shape)
+  for i in range(Q.shape[0]):
+    # Hamiltonian [[A, -B R^-1 B^T], [-Q, -A^T]]
+    G = B@np.linalg.solve(R[i], B.T)
+    H = np.block([[A, -G],
+                  [-Q[i], -A.T]])
+    _, U, dim = schur(H, sort="lhp")
+    if dim != n:
+      raise np.linalg.LinAlgError("Hamiltonian has eigenvalues on the imaginary axis")
+    S[i] = _stable_solution(U, n)
+  return S if batched else S[0]
+
+def dare(A: ArrayLike, B: ArrayLike, Q: ArrayLike, R: ArrayLike) -> ArrayLike:
+  """Solve S = A^T S A - A^T S B (R + B^T S B)^-1 B^T S A + Q.
+
+  A: ArrayLike: n x n state matrix
+  B: ArrayLike: n x m input matrix
+  Q: ArrayLike: n x n state penalty, or (batch, n, n)
+  R: ArrayLike: m x m input penalty (or a scalar), or (batch, m, m)"""
+  from scipy.linalg import ordqz
+  A, B, Q, R, batched = _weights(A, B, Q, R)
+  n = A.shape[0]
+  S = np.empty(Q.shape)
+  for i in range(Q.shape[0]):
+    # Symplectic pencil [[A, 0], [-Q, I]] - z [[I, B R^-1 B^T], [0, A^T]]
+    G = B@np.linalg.solve(R[i], B.T)
+    M = np.block([[A, np.zeros((n, n))],
+                  [-Q[i], np.eye(n)]])
+    N = np.block([[np.eye(n), G],
+                  [np.zeros((n, n)), A.T]])
+    _, _, alpha, beta, _, U = ordqz(M, N, sort="iuc", output="real")
+    # ordqz doesn't count the eigenvalues it sorted first, so count the
+    # ones clearly inside the unit circle
+    dim = np.count_nonzero(np.abs(alpha) < (1 - _UNIT_CIRCLE)*np.abs(beta))
+    if dim != n:
+      raise np.linalg.LinAlgError("symplectic pencil has eigenvalues on the unit circle")
+    S[i] = _stable_solution(U, n)
+  return S if batched else S[0]
+
+def lqr(A: ArrayLike,
+        B: ArrayLike,
+        Q: ArrayLike,
+        R: ArrayLike) -> Tuple[ArrayLike, ArrayLike, ArrayLike]:
+  """Continuous LQR, a drop-in for control.lqr(A, B, Q, R).
+
+  A: ArrayLike: n x n state matrix
+  B: ArrayLike: n x m input matrix
+  Q: ArrayLike: n x n state penalty, or (batch, n, n)
+  R: ArrayLike: m x m input penalty (or a scalar), or (batch, m, m)
+
+  returns: K, S, E (gain, Riccati solution, closed-loop eigenvalues)"""
+  A, B, Q_s, R_s, batched = _weights(A, B, Q, R)
+  S = care(A, B, Q_s, R_s)
+  K = np.linalg.solve(R_s, B.T@S)
+  E = np.linalg.eigvals(A - B@K)
+  return (K, S, E) if batched else (K[0], S[0], E[0])
+
+def dlqr(A: ArrayLike,
+         B: ArrayLike,
+         Q: ArrayLike,
+         R: ArrayLike) -> Tuple[ArrayLike, ArrayLike, ArrayLike]:
+  """Discrete LQR, a drop-in for control.dlqr(A, B, Q, R).
+
+  A: ArrayLike: n x n state matrix
+  B: ArrayLike: n x m input matrix
+  Q: ArrayLike: n x n state penalty, or (batch, n, n)
+  R: ArrayLike: m x m input penalty (or a scalar), or (batch, m, m)
+
+  returns: K, S, E (gain, Riccati solution, closed-loop eigenvalues)"""
+  A, B, Q_s, R_s, batched = _weights(A, B, Q, R)
+  S = dare(A, B, Q_s, R_s)
+  K = np.linalg.solve(R_s + B.T@S@B, B.T@S@A)
+  E = np.linalg.eigvals(A - B@K)
+  return (K, S, E) if batched else (K[0], S[0], E[0])
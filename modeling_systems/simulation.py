@@ -0,0 +1,661 @@
+"""Stepping and simulation routines from the practicums.
+
+Everything goes through one engine, simulate(), with one protocol:
+
+  plant.dynamics(x, u) -> x_dot and plant.output(x) -> y, with 1-D
+    states. Plants with linear = True also expose A, B and C.
+  controller(x, t) -> u, evaluated once per step and held over it.
+    Single input/output signals are passed around as scalars.
+    Controllers with feedback = "output" (e.g. PIDController) are
+    handed the measurement y instead of the state.
+  estimator(xhat, u, y) -> xhat_dot, integrated with the same stepper
+    as the plant, or the next xhat directly when discrete = True
+    (e.g. SteadyStateKalmanFilter). With an estimator the controller
+    sees xhat instead of x.
+
+Linear plants under a StateFeedbackRegulator (with no estimator, a
+StateEstimator or a SteadyStateKalmanFilter) are recognized and run
+as a single fused recurrence instead of the general stepping loop,
+pre-drawn noise included as long as the sensor noise isn't quantized.
+"""
+
+import numpy as np
+from contextlib import nullcontext
+from numpy.typing import ArrayLike
+from typing import Callable
+from typing import Sequence
+from typing import Tuple
+from typing import Union
+
+from .controllers import StateFeedbackRegulator
+from .discretize import euler_matrices
+from .discretize import rk2_matrices
+from .discretize import rk4_matrices
+from .discretize import zoh
+from .estimators import StateEstimator
+from .kalman import SteadyStateKalmanFilter
+from .noise import NoiseBuffer
+from .profiling import Profiler
+from .recording import Recorder
+from .recording import Recording
+from .stopping import StopCondition
+from .trajectory import Trajectory
+
+
+class CallCounter:
+  """Wrap a callable and count how many times it gets called."""
+  def __init__(self, func: Callable) -> None:
+    """Store the wrapped callable and zero the counter.
+
+    func: Callable: callable to count"""
+    self.func = func
+    self.calls = 0
+
+  def __call__(self, *args, **kwargs):
+    """Count the call and forward it."""
+    self.calls += 1
+    return self.func(*args, **kwargs)
+
+
+def euler_step(dyn_func: Callable,
+               u_func: Callable,
+               x: ArrayLike,
+               t: float,
+               delta_t: float) -> ArrayLike:
+  """Computing x_k_1 with a forward Euler step.
+
+  dyn_func: Callable: function being integrated
+  u_func: Callable: input function
+  x: ArrayLike: x_k value using to estimate x_k_1
+  t: float: current time
+  delta_t: float: time step"""
+  return x + delta_t*dyn_func(x, u_func(t))
+
+def rk2_step(dyn_func: Callable,
+             u_func: Callable,
+             x: ArrayLike,
+             t: float,
+             delta_t: float) -> ArrayLike:
+  """Computing f1, f2, and x_k_1.
+
+  dyn_func: Callable: function being integrated
+  u_func: Callable: input function
+  x: ArrayLike: x_k value using to estimate x_k_1
+  t: float: current time
+  delta_t: float: time step"""
+  f_1 = dyn_func(x, u_func(t))
+  f_2 = dyn_func(x + delta_t/2*f_1, u_func(t+delta_t/2))
+  return x + delta_t*f_2
+
+def rk4_step(dyn_func: Callable,
+             u_func: Callable,
+             x: ArrayLike,
+             t: float,
+             delta_t: float) -> ArrayLike:
+  """Computing f1 to f4, and x_k_1 with the classic Runge-Kutta step.
+
+  dyn_func: Callable: function being integrated
+  u_func: Callable: input function
+  x: ArrayLike: x_k value using to estimate x_k_1
+  t: float: current time
+  delta_t: float: time step"""
+  u_half = u_func(t+delta_t/2)
+  f_1 = dyn_func(x, u_func(t))
+  f_2 = dyn_func(x + delta_t/2*f_1, u_half)
+  f_3 = dyn_func(x + delta_t/2*f_2, u_half)
+  f_4 = dyn_func(x + delta_t*f_3, u_func(t+delta_t))
+  return x + delta_t/6*(f_1 + 2*f_2 + 2*f_3 + f_4)
+
+STEPPERS = {
+  "euler": euler_step,
+  "rk2": rk2_step,
+  "rk4": rk4_step,
+}
+
+# Function evaluations each stepper makes per step
+EVALUATIONS = {
+  "euler": 1,
+  "rk2": 2,
+  "rk4": 4,
+}
+
+# (Phi, Gamma) each stepper amounts to on a linear system with held
+# input. "exact" has no stepper and is only available on the fast path.
+_MATRICES = {
+  "euler": euler_matrices,
+  "rk2": rk2_matrices,
+  "rk4": rk4_matrices,
+  "exact": zoh,
+}
+
+OUTPUTS = ("xhat", "u", "y")
+
+# Fast path loops up to this many plant states get their recurrence
+# checked for stability before the run (an eigenvalue problem, so it
+# would cost more than the run itself on big systems, see
+# stability.check_step for how repeated runs avoid paying it again)
+_CHECK_STATES = 200
+
+# Samples are stepped into a buffer this long (rounded to whole
+# recording windows), then checked for a stop and recorded together
+_BLOCK = 64
+
+
+class _HeldInput:
+  """Input function that returns the value held over the step."""
+  def __init__(self) -> None:
+    self.value = None
+
+  def __call__(self, t: float):
+    return self.value
+
+
+def _flush(recorder: Recorder,
+           stop: StopCondition,
+           output: Callable,
+           t_vals: ArrayLike,
+           rows: dict,
+           start: int,
+           count: int) -> bool:
+  """Hand a block of count samples, starting at sample start, to the
+  stop condition and then the recorder. output maps a block of states to
+  their outputs. Returns True if the run stops in this block."""
+  stopped = False
+  if stop is not None:
+    x_block = rows["x"][:count]
+    y_block = output(x_block) if stop.needs_output else None
+    k = stop.check(t_vals[start:start+count], x_block, y_block, offset=start)
+    if k is not None:
+      count = k - start + 1
+      stopped = True
+  recorder.add(rows, start, count)
+  return stopped
+
+
+class _EstimatorDynamics:
+  """dyn_func(x, u) view of an estimator, with y held over the step."""
+  def __init__(self, estimator) -> None:
+    self.estimator = estimator
+    self.y = None
+
+  def __call__(self, x: ArrayLike, u: ArrayLike) -> ArrayLike:
+    return self.estimator(x, u, self.y)
+
+
+def simulate(plant,
+             controller,
+             x_0: ArrayLike,
+             t_0: float,
+             t_f: float,
+             delta_t: Union[float, str],
+             estimator=None,
+             xhat_0: ArrayLike=None,
+             outputs: Sequence[str]=("u",),
+             stepper: str="rk2",
+             process_noise: NoiseBuffer=None,
+             sensor_noise: NoiseBuffer=None,
+             stats: dict=None,
+             profiler: Profiler=None,
+             stop: StopCondition=None,
+             record: Recording=None) -> Trajectory:
+  """Simulate a plant in closed loop with a controller and optionally
+  a state estimator, following the protocol in the module docstring.
+
+  Logs are laid out the same way for every path: u[i] is the input
+  held over the step from t[i-1] to t[i] (u[0] = 0), y[0] = y(x[0])
+  and y[i] = y(x[i-1]) is the measurement the step started from.
+  Single input / single output logs are 1-D.
+
+  Linear loops on the fast path are checked against the stepper's
+  stability limit first, with a RuntimeWarning if delta_t is past it
+  (see stability.py).
+
+  plant: what we are controlling
+  controller: controller from which input is received
+  x_0: ArrayLike: initial conditions, (n,) or a batch (N, n) on the
+    fast path
+  t_0: float: initial time
+  t_f: float: final time
+  delta_t: float: time step, or "auto" for the largest stable one
+    (with a margin, see stability.auto_step). A discrete estimator
+    with a delta_t of its own (SteadyStateKalmanFilter) fixes it, "auto"
+    then means that one and any other raises ValueError
+  estimator: optional state estimator the controller is driven by
+  xhat_0: ArrayLike: initial conditions of the estimate
+  outputs: Sequence[str]: extra logs to return, any of "xhat", "u"
+    and "y", in the order they should be returned
+  stepper: str: "euler", "rk2", "rk4" or "exact" (zero-order hold,
+    linear fast path only)
+  process_noise: NoiseBuffer: optional noise added to x after each step
+  sensor_noise: NoiseBuffer: optional noise added to every measurement.
+    Either can be batched like x_0 for Monte Carlo runs; quantized
+    sensor noise isn't linear, so it takes the general loop, which runs
+    one initial condition at a time
+  stats: dict: optional dict, filled with "controller_calls", the
+    number of controller evaluations made each step
+  profiler: Profiler: optional per-phase profiler, see profiling.py
+  stop: StopCondition: optional early stop, the logs are cut at the
+    sample it stops at and stop.reason says why (None if it ran to t_f)
+  record: Recording: optional decimation, state selection or min/max
+    envelopes of the logs, see recording.py
+
+  returns: Trajectory, the tuple time, x, then the requested outputs,
+    with named columns on top (see trajectory.py)"""
+  for name in outputs:
+    if name not in OUTPUTS:
+      raise ValueError(f"unknown output {name!r}, expected one of {OUTPUTS}")
+  if estimator is None and "xhat" in outputs:
+    raise ValueError("xhat output requested without an estimator")
+  if stepper not in _MATRICES:
+    raise ValueError(f"unknown stepper {stepper!r}, expected one of {tuple(_MATRICES)}")
+  if estimator is not None and xhat_0 is None:
+    xhat_0 = np.zeros(np.shape(x_0)[-1])
+  # A discrete estimator's matrices are discretized at its own step
+  estimator_step = (getattr(estimator, "delta_t", None)
+                    if getattr(estimator, "discrete", False) else None)
+  if isinstance(delta_t, str):
+    if delta_t != "auto":
+      raise ValueError(f"delta_t must be a number or 'auto', got {delta_t!r}")
+    if estimator_step is not None:
+      delta_t = estimator_step
+    else:
+      # stability.py builds on this module, so it's imported when needed
+      from .stability import auto_step
+      delta_t = auto_step(plant, controller, estimator, stepper, x_0, t_0, t_f)
+  if estimator_step is not None and not np.isclose(estimator_step, delta_t):
+    raise ValueError(f"the estimator was discretized at delta_t={estimator_step}, "
+                     f"can't run it at {delta_t}")
+
+  # Generate our t values
+  t_vals = np.arange(start=t_0,
+                     stop=t_f+delta_t,
+                     step=delta_t)
+
+  fast = (getattr(plant, "linear", False)
+          and isinstance(controller, StateFeedbackRegulator)
+          and (estimator is None
+               or isinstance(estimator, (StateEstimator, SteadyStateKalmanFilter)))
+          and (sensor_noise is None or not sensor_noise.quantization)
+          and stats is None)
+  if not fast and stepper not in STEPPERS:
+    raise ValueError(f"the {stepper!r} stepper needs a linear plant "
+                     "driven by a StateFeedbackRegulator")
+  if not fast and np.ndim(x_0) != 1:
+    raise ValueError("batched initial conditions need a linear plant driven by "
+                     "a StateFeedbackRegulator, without stats or quantized sensor noise")
+  for noise in (process_noise, sensor_noise):
+    if noise is not None and noise.batch != np.shape(x_0)[:-1]:
+      raise ValueError(f"noise drawn for a batch of {noise.batch}, but x_0 is "
+                       f"a batch of {np.shape(x_0)[:-1]}")
+  if stop is not None:
+    if np.ndim(x_0) != 1:
+      raise ValueError("stop conditions need a single initial condition")
+    stop.reset()
+  if fast and np.shape(plant.A)[0] <= _CHECK_STATES:
+    from .stability import check_step
+    check_step(plant, controller, estimator, delta_t, stepper)
+
+  recorder = Recorder(record, len(t_vals), _BLOCK)
+  if profiler is None:
+    profiled = nullcontext()
+  else:
+    profiled = profiler.run("fast" if fast else "loop", len(t_vals) - 1)
+  with profiled:
+    if fast:
+      _simulate_linear(plant, controller, estimator, x_0, xhat_0,
+                       t_vals, delta_t, stepper, outputs,
+                       process_noise, sensor_noise, profiler, stop, recorder)
+    else:
+      _simulate_loop(plant, controller, estimator, x_0, xhat_0,
+                     t_vals, delta_t, STEPPERS[stepper], outputs,
+                     process_noise, sensor_noise, stats, profiler, stop, recorder)
+  logs = recorder.result()
+  # Every k-th sample (or window start), and shorter if a stop condition
+  # ended the run
+  t_vals = t_vals[::recorder.recording.every][:len(logs["x"])]
+
+  # Single input / single output systems get 1-D logs
+  for name in ("u", "y"):
+    if name in logs and logs[name].shape[-1] == 1:
+      logs[name] = logs[name][..., 0]
+  x_vals = logs.pop("x")
+  return Trajectory(t_vals, x_vals, logs, outputs, plant=plant,
+                    setpoint=getattr(controller, "setpoint", None),
+                    recording=recorder.recording)
+
+def _simulate_loop(plant,
+                   controller,
+                   estimator,
+                   x_0: ArrayLike,
+                   xhat_0: ArrayLike,
+                   t_vals: ArrayLike,
+                   delta_t: float,
+                   step: Callable,
+                   outputs: Sequence[str],
+                   process_noise: NoiseBuffer,
+                   sensor_noise: NoiseBuffer,
+                   stats: dict,
+                   profiler: Profiler,
+                   stop: StopCondition,
+                   recorder: Recorder) -> None:
+  """General stepping loop, any plant/controller/estimator."""
+  x = np.array(x_0, dtype=float)
+
+  # Measurements of x at t[k], with the sensor noise drawn for step k
+  if sensor_noise is None:
+    measure = lambda x, k: np.ravel(plant.output(x))
+  else:
+    measure = lambda x, k: sensor_noise.apply(np.ravel(plant.output(x)), k)
+
+  # Block buffers, sample 0 first
+  block = recorder.block
+  y = measure(x, 0)
+  rows = {"x": np.zeros([block, x.size])}
+  rows["x"][0] = x
+  if "y" in outputs:
+    rows["y"] = np.zeros([block, y.size])
+    rows["y"][0] = y
+
+  if estimator is not None:
+    x_hat = np.array(xhat_0, dtype=float)
+    if "xhat" in outputs:
+      rows["xhat"] = np.zeros([block, x_hat.size])
+      rows["xhat"][0] = x_hat
+    discrete = getattr(estimator, "discrete", False)
+    est_dynamics = est_func = _EstimatorDynamics(estimator)
+  output_feedback = getattr(controller, "feedback", "state") == "output"
+
+  # Running call count, turned into per-step counts at the end
+  if stats is not None:
+    counter = controller = CallCounter(controller)
+    call_counts = np.zeros(len(t_vals), dtype=int)
+
+  # Wrapped in timers up front, so the loop is the same either way
+  dynamics = plant.dynamics
+  plant_step = est_step = step
+  if profiler is not None:
+    measure = profiler.wrap("measure", measure)
+    controller = profiler.wrap("controller", controller)
+    dynamics = profiler.wrap("plant_step;dynamics", dynamics)
+    plant_step = profiler.wrap("plant_step", step)
+    if estimator is not None and discrete:
+      estimator = profiler.wrap("estimator_step", estimator)
+    elif estimator is not None:
+      est_func = profiler.wrap("estimator_step;estimator", est_func)
+      est_step = profiler.wrap("estimator_step", step)
+
+  u_func = _HeldInput()
+  output = lambda x_block: np.array([np.ravel(plant.output(x)) for x in x_block])
+  start, j = 0, 1
+  stopped = False
+
+  # Using our stepper
+  for i in range(1, len(t_vals)):
+    if j == block:
+      if "u" in outputs and "u" not in rows:
+        rows["u"] = np.zeros([block, 1])
+      stopped = _flush(recorder, stop, output, t_vals, rows, start, block)
+      if stopped:
+        break
+      start, j = i, 0
+
+    y = measure(x, i-1)
+
+    # One controller evaluation per step, held for every stage
+    if output_feedback:
+      feedback = y[0] if y.size == 1 else y
+    elif estimator is not None:
+      feedback = x_hat
+    else:
+      feedback = x
+    u = np.ravel(controller(feedback, t_vals[i-1]))
+    # U history, sized once the controller tells us m (u[0] stays 0)
+    if "u" in outputs:
+      if "u" not in rows:
+        rows["u"] = np.zeros([block, u.size])
+      rows["u"][j] = u
+    # Single input plants (and PID) get plain scalars, as in the practicums
+    if u.size == 1:
+      u = u[0]
+    u_func.value = u
+
+    x = plant_step(dynamics, u_func, x, t_vals[i-1], delta_t)
+    if process_noise is not None:
+      x = x + process_noise[i-1]
+
+    if estimator is None:
+      pass
+    elif discrete:
+      x_hat = estimator(x_hat, u, measure(x, i))
+    else:
+      est_dynamics.y = y
+      x_hat = est_step(est_func, u_func, x_hat, t_vals[i-1], delta_t)
+
+    rows["x"][j] = x
+    if "y" in rows:
+      rows["y"][j] = y
+    if "xhat" in rows:
+      rows["xhat"][j] = x_hat
+    if stats is not None:
+      call_counts[i] = counter.calls
+    j += 1
+
+  if not stopped:
+    if "u" in outputs and "u" not in rows:
+      rows["u"] = np.zeros([block, 1])
+    _flush(recorder, stop, output, t_vals, rows, start, j)
+
+  if stats is not None:
+    end = stop.index + 1 if stop is not None and stop.index is not None else len(t_vals)
+    stats["controller_calls"] = np.diff(call_counts[:end], prepend=0)
+
+def _loop_matrices(plant,
+                   controller: StateFeedbackRegulator,
+                   estimator,
+                   delta_t: float,
+                   stepper: str) -> Tuple[ArrayLike, ArrayLike, ArrayLike, ArrayLike]:
+  """The fast path's z_k_1 = M z_k + N (k_f r_k) recurrence, z = x or
+  [x; xhat] with an estimator.
+
+  returns: M, N, K (m x n) and C (p x n)"""
+  A = np.atleast_2d(np.asarray(plant.A, dtype=float))
+  n = A.shape[0]
+  B = np.reshape(np.asarray(plant.B, dtype=float), (n, -1))
+  m = B.shape[1]
+  C = np.reshape(np.asarray(plant.C, dtype=float), (-1, n))
+  K = np.reshape(np.asarray(controller.k, dtype=float), (m, n))
+  matrices = _MATRICES[stepper]
+  Pa, Ga = matrices(A, B, delta_t)
+
+  if estimator is None:
+    return Pa - Ga@K, Ga, K, C
+  if isinstance(estimator, SteadyStateKalmanFilter):
+    # xhat_k_1 = F xhat_k + G u_k + L C x_k_1
+    Geu = estimator.G + estimator.L@C@Ga
+    est_x = estimator.L@C@Pa
+    Pe = estimator.F
+  else:
+    # xhat_dot = (Ae-LCe) xhat + [Be, L] [u; y], y = C x held over the step
+    Ae = np.asarray(estimator.plant.A, dtype=float)
+    Be = np.reshape(np.asarray(estimator.plant.B, dtype=float), (n, -1))
+    Ce = np.reshape(np.asarray(estimator.plant.C, dtype=float), (-1, n))
+    L = estimator.L
+    Pe, Ge = matrices(Ae - L@Ce, np.hstack((Be, L)), delta_t)
+    Geu = Ge[:, :m]
+    est_x = Ge[:, m:]@C
+  M = np.block([[Pa, -Ga@K],
+                [est_x, Pe - Geu@K]])
+  N = np.vstack((Ga, Geu))
+  return M, N, K, C
+
+def _noise_matrices(plant,
+                    estimator,
+                    delta_t: float,
+                    stepper: str) -> Tuple[ArrayLike, ArrayLike, int]:
+  """How pre-drawn noise enters the fast path's recurrence: step k adds
+  W w_k of the process noise and V v of the sensor noise, v being the
+  measurement noise of sample k+1 for a discrete estimator (it filters
+  the measurement taken after the step) and of sample k otherwise.
+
+  returns: W, V (None without an estimator, the noise only reaches the
+    y log then) and the sample offset of v"""
+  A = np.atleast_2d(np.asarray(plant.A, dtype=float))
+  n = A.shape[0]
+  C = np.reshape(np.asarray(plant.C, dtype=float), (-1, n))
+  if estimator is None:
+    return np.eye(n), None, 0
+  if isinstance(estimator, SteadyStateKalmanFilter):
+    # xhat_k_1 gets L (C x_k_1 + v_k_1), and x_k_1 has w_k in it
+    W = np.vstack((np.eye(n), estimator.L@C))
+    V = np.vstack((np.zeros((n, C.shape[0])), estimator.L))
+    return W, V, 1
+  # The estimator's y input, held over the step, is C x_k + v_k
+  Ae = np.asarray(estimator.plant.A, dtype=float)
+  Be = np.reshape(np.asarray(estimator.plant.B, dtype=float), (n, -1))
+  Ce = np.reshape(np.asarray(estimator.plant.C, dtype=float), (-1, n))
+  L = estimator.L
+  _, Ge = _MATRICES[stepper](Ae - L@Ce, np.hstack((Be, L)), delta_t)
+  W = np.vstack((np.eye(n), np.zeros((n, n))))
+  V = np.vstack((np.zeros((n, C.shape[0])), Ge[:, Be.shape[1]:]))
+  return W, V, 0
+
+def _simulate_linear(plant,
+                     controller: StateFeedbackRegulator,
+                     estimator,
+                     x_0: ArrayLike,
+                     xhat_0: ArrayLike,
+                     t_vals: ArrayLike,
+                     delta_t: float,
+                     stepper: str,
+                     outputs: Sequence[str],
+                     process_noise: NoiseBuffer,
+                     sensor_noise: NoiseBuffer,
+                     profiler: Profiler,
+                     stop: StopCondition,
+                     recorder: Recorder) -> None:
+  """Fast path: the whole loop as z_k_1 = M z_k + N r_k (+ noise).
+
+  With (Phi, Gamma) the plant recurrence of the stepper and u_k held at
+  -K c_k + k_f r_k (c is x, or xhat with an estimator), this steps
+  exactly what the general loop does, one matmul per step. Noise is
+  read a block at a time and added to the drive, see _noise_matrices()."""
+  phase = profiler.phase if profiler is not None else lambda name: nullcontext()
+  with phase("discretize"):
+    M, N, K, C = _loop_matrices(plant, controller, estimator, delta_t, stepper)
+    m, n = K.shape
+    if estimator is None:
+      z_0 = np.asarray(x_0, dtype=float)
+    else:
+      x_0, xhat_0 = np.broadcast_arrays(np.asarray(x_0, dtype=float),
+                                        np.asarray(xhat_0, dtype=float))
+      z_0 = np.concatenate((x_0, xhat_0), axis=-1)
+
+    # Feedforward term k_f r_k of steps lo to hi-1, worked out a block at
+    # a time. Any batch dimensions are kept in the middle (indexing keeps
+    # a broadcast ff a view)
+    batch = (slice(None),) + (None,)*(z_0.ndim-1)
+    if callable(controller.setpoint):
+      def feedforward(lo: int, hi: int) -> ArrayLike:
+        ff = [controller.k_f*controller.setpoint(t) for t in t_vals[lo:hi]]
+        return np.reshape(ff, (hi - lo, m))[batch]
+    else:
+      constant = np.reshape(controller.k_f*controller.setpoint, (m,))
+      feedforward = lambda lo, hi: np.broadcast_to(constant, (hi - lo, m))[batch]
+    M_t = M.T
+    if process_noise is not None or sensor_noise is not None:
+      W, V, ahead = _noise_matrices(plant, estimator, delta_t, stepper)
+
+  # Block buffer of z, and z at the sample before the block (sample 0
+  # stands in for its own)
+  block = recorder.block
+  z_vals = np.zeros((block,) + z_0.shape)
+  z_prev = z_0
+  output = lambda x_block: x_block@C.T
+  for start in range(0, len(t_vals), block):
+    count = min(block, len(t_vals) - start)
+    with phase("recurrence"):
+      # Sample j of the block is stepped from j-1 with drive[j-1]
+      first = 1 if start == 0 else 0
+      lo, hi = start+first-1, start+count-1
+      ff = feedforward(lo, hi)
+      drive = ff@N.T
+      if process_noise is not None:
+        drive = drive + process_noise[lo:hi]@W.T
+      if sensor_noise is not None:
+        # Every sample the block's steps and y log measure, read once
+        # since noise only reads forward
+        base = max(start-1, 0)
+        v = sensor_noise[base:start+count]
+        if V is not None:
+          drive = drive + v[lo+ahead-base:hi+ahead-base]@V.T
+      z = z_prev
+      z_vals[0] = z
+      for j in range(first, count):
+        z = z@M_t + drive[j-first]
+        z_vals[j] = z
+
+    with phase("logs"):
+      rows = {"x": z_vals[..., :n]}
+      if estimator is not None and "xhat" in outputs:
+        rows["xhat"] = z_vals[..., n:]
+      if "u" in outputs or "y" in outputs:
+        # u and y logged the same way the general loop does, from the
+        # sample before each one
+        prev = np.concatenate((z_prev[None], z_vals[:count-1]))
+      if "u" in outputs:
+        c_prev = prev[..., :n] if estimator is None else prev[..., n:]
+        u_vals = -c_prev@K.T
+        if start:
+          u_vals += ff
+        else:
+          u_vals[1:] += ff
+          u_vals[0] = 0
+        rows["u"] = u_vals
+      if "y" in outputs:
+        rows["y"] = prev[..., :n]@C.T
+        if sensor_noise is not None:
+          # Row j measures sample start+j-1, sample 0 its own
+          rows["y"] = rows["y"] + v[np.maximum(np.arange(start-1, start+count-1), 0) - base]
+      if _flush(recorder, stop, output, t_vals, rows, start, count):
+        break
+      z_prev = z_vals[count-1].copy()
+
+def simulate_final(plant,
+                   plant_est,
+                   controller,
+                   x_0: ArrayLike,
+                   xhat_0: ArrayLike,
+                   t_0: float,
+                   t_f: float,
+                   delta_t: float,
+                   process_noise: NoiseBuffer=None,
+                   sensor_noise: NoiseBuffer=None,
+                   stats: dict=None,
+                   profiler: Profiler=None) -> Trajectory:
+  """Simulate a plant driven by a controller that only sees the
+  state estimate. Practicum 4's signature for simulate() with an
+  estimator and every log requested.
+
+  plant: what we are controlling
+  plant_est: the estimator of what we're controlling
+  controller: controller from which input is received
+  x_0: ArrayLike: initial conditions
+  xhat_0: ArrayLike: initial conditions of the estimate
+  t_0: float: initial time
+  t_f: float: final time
+  delta_t: float: time step
+  process_noise: NoiseBuffer: optional noise added to x after each step
+  sensor_noise: NoiseBuffer: optional noise added to every measurement
+  stats: dict: optional dict, filled with "controller_calls", the
+    number of controller evaluations made each step
+  profiler: Profiler: optional per-phase profiler, see profiling.py
+
+  returns: Trajectory of time, x, xhat, u, y"""
+  return simulate(plant, controller, x_0, t_0, t_f, delta_t,
+                  estimator=plant_est,
+                  xhat_0=xhat_0,
+                  outputs=("xhat", "u", "y"),
+                  process_noise=process_noise,
+                  sensor_noise=sensor_noise,
+                  stats=stats,
+                  profiler=profiler)
@@ -0,0 +1,280 @@
+"""Largest stable time step from the closed-loop spectrum.
+
+An explicit stepper applied to x_dot = lambda x multiplies x by R(h
+lambda) every step, with R the stepper's stability polynomial:
+
+  euler  1 + z
+  rk2    1 + z + z^2/2
+  rk4    1 + z + z^2/2 + z^3/6 + z^4/24
+
+so a mode that decays in continuous time only decays in the simulation
+while |R(h lambda)| <= 1. The modes that matter are the loop's: A on its
+own, A - BK under state feedback, and A - LC on top of that with an
+observer (the separation principle). The fastest or least damped of
+them limits the step, which is why a faster pole placement can make an
+old delta_t blow up.
+
+With the input held over each step (see simulation.py) the recurrence
+of a linear loop isn't exactly R(h(A - BK)) beyond euler, so for loops
+simulate() runs on its fast path the limit is refined on the spectral
+radius of the recurrence it actually steps. That is also what
+simulate() checks, to warn before a run that is going to diverge, and
+what simulate(..., delta_t="auto") picks its step from.
+"""
+
+import hashlib
+import warnings
+import numpy as np
+from numpy.typing import ArrayLike
+from dataclasses import dataclass
+from typing import Tuple
+
+from .controllers import StateFeedbackRegulator
+from .estimators import StateEstimator
+from .kalman import SteadyStateKalmanFilter
+from .simulation import _loop_matrices
+
+# Coefficients of each stepper's stability polynomial, lowest power first
+STABILITY_POLYNOMIALS = {
+  "euler": (1, 1),
+  "rk2": (1, 1, 1/2),
+  "rk4": (1, 1, 1/2, 1/6, 1/24),
+}
+
+# Fraction of the largest stable step delta_t="auto" uses
+SAFETY = 0.9
+
+# Every region above fits in a disk of this radius around the origin
+_REGION_RADIUS = 3.0
+_SLACK = 1E-9
+
+# Spectral radii of the recurrences check_step has seen, oldest first
+_checked = {}
+_CHECKED_SIZE = 256
+
+
+@dataclass
+class StepAdvice:
+  """Stability limit of one stepper on one loop.
+
+  stepper: str: name in STEPPERS, or "exact"
+  max_delta_t: float: largest stable step, inf if nothing limits it
+  region_delta_t: float: the limit from the stability polynomial alone
+  limiting_eigenvalue: complex: the mode that sets region_delta_t
+  spectrum: np.ndarray: continuous-time closed-loop eigenvalues
+  unstable: np.ndarray: the ones that grow in continuous time, which no
+    step size can stabilize"""
+  stepper: str
+  max_delta_t: float
+  region_delta_t: float
+  limiting_eigenvalue: complex
+  spectrum: np.ndarray
+  unstable: np.ndarray
+
+
+def amplification(z: ArrayLike, stepper: str) -> ArrayLike:
+  """|R(z)|, the factor a mode with h lambda = z grows by every step.
+
+  z: ArrayLike: h lambda, complex
+  stepper: str: name in STABILITY_POLYNOMIALS"""
+  return np.abs(np.polyval(STABILITY_POLYNOMIALS[stepper][::-1], z))
+
+def _jacobians(plant, x: ArrayLike, m: int) -> Tuple[ArrayLike, ArrayLike]:
+  """A and B of a nonlinear plant linearized at x (with zero input), by
+  central differences."""
+  x = np.asarray(x, dtype=float)
+  u = np.zeros(m)
+  dynamics = lambda x, u: np.ravel(plant.dynamics(x, u[0] if m == 1 else u))
+  eps = 1E-6*max(1.0, np.abs(x).max(initial=0.0))
+  A = np.column_stack([(dynamics(x + eps*e, u) - dynamics(x - eps*e, u))/(2*eps)
+                       for e in np.eye(len(x))])
+  B = np.column_stack([(dynamics(x, u + eps*e) - dynamics(x, u - eps*e))/(2*eps)
+                       for e in np.eye(m)])
+  return A, B
+
+def closed_loop_spectrum(plant, controller=None, estimator=None, x: ArrayLike=None) -> np.ndarray:
+  """Continuous-time eigenvalues of the loop.
+
+  Linear plants use A and B, anything else is linearized at x. A
+  StateFeedbackRegulator closes the loop through A - BK, other
+  controllers (PID) leave the open-loop spectrum. A StateEstimator adds
+  the observer's A - LC modes. A SteadyStateKalmanFilter is already
+  discrete, so it adds nothing.
+
+  plant: what we are controlling
+  controller: optional controller
+  estimator: optional state estimator
+  x: ArrayLike: operating point of nonlinear plants
+
+  returns: eigenvalues, plant (and observer) modes"""
+  m = None
+  if isinstance(controller, StateFeedbackRegulator):
+    m = np.atleast_2d(controller.k).shape[0]
+  if getattr(plant, "linear", False):
+    A = np.atleast_2d(np.asarray(plant.A, dtype=float))
+    B = np.reshape(np.asarray(plant.B, dtype=float), (A.shape[0], -1))
+  elif x is None:
+    raise ValueError("nonlinear plants need an operating point x to linearize at")
+  else:
+    A, B = _jacobians(plant, x, m or 1)
+
+  A_cl = A
+  if m is not None:
+    A_cl = A - B@np.reshape(np.asarray(controller.k, dtype=float), (m, -1))
+  spectrum = np.linalg.eigvals(A_cl)
+  if isinstance(estimator, StateEstimator):
+    Ae = np.atleast_2d(np.asarray(estimator.plant.A, dtype=float))
+    Ce = np.reshape(np.asarray(estimator.plant.C, dtype=float), (-1, Ae.shape[0]))
+    spectrum = np.concatenate((spectrum, np.linalg.eigvals(Ae - estimator.L@Ce)))
+  return spectrum
+
+def _region_radius(direction: complex, stepper: str) -> float:
+  """How far the stability region reaches from the origin along a ray."""
+  s = np.linspace(0, _REGION_RADIUS, 3001)[1:]
+  outside = amplification(s*direction, stepper) > 1 + _SLACK
+  if not outside.any():
+    return _REGION_RADIUS
+  k = np.argmax(outside)
+  lo, hi = (s[k-1] if k else 0.0), s[k]
+  for _ in range(40):
+    mid = (lo + hi)/2
+    if amplification(mid*direction, stepper) > 1 + _SLACK:
+      hi = mid
+    else:
+      lo = mid
+  return lo
+
+def stability_limit(eigenvalues: ArrayLike, stepper: str) -> Tuple[float, complex]:
+  """Largest h with |R(h lambda)| <= 1 for every decaying mode.
+
+  Modes that don't decay in continuous time are left out, no step
+  fixes those.
+
+  eigenvalues: ArrayLike: continuous-time eigenvalues
+  stepper: str: name in STABILITY_POLYNOMIALS, or "exact"
+
+  returns: the largest stable step (inf if nothing limits it) and the
+    eigenvalue that sets it"""
+  best, limiting = np.inf, None
+  if stepper == "exact":
+    return best, limiting
+  for lam in np.asarray(eigenvalues, dtype=complex):
+    if lam.real >= 0:
+      continue
+    h = _region_radius(lam/abs(lam), stepper)/abs(lam)
+    if h < best:
+      best, limiting = h, lam
+  return best, limiting
+
+def _spectral_radius(M: ArrayLike) -> float:
+  return float(np.abs(np.linalg.eigvals(M)).max())
+
+def _recurrence_limit(plant, controller, estimator, stepper: str, guess: float) -> float:
+  """Largest step at which the fast path's recurrence is stable,
+  searched for around guess."""
+  stable = lambda h: _spectral_radius(
+    _loop_matrices(plant, controller, estimator, h, stepper)[0]) <= 1 + _SLACK
+  lo, hi = 0.0, guess
+  if stable(hi):
+    # Grow until it breaks, or give up: nothing limits the step
+    while stable(2*hi):
+      hi *= 2
+      if hi > 1E3*guess:
+        return np.inf
+    lo, hi = hi, 2*hi
+  for _ in range(50):
+    mid = (lo + hi)/2
+    if stable(mid):
+      lo = mid
+    else:
+      hi = mid
+    if hi - lo <= 1E-6*hi:
+      break
+  return lo
+
+def _fast(plant, controller, estimator) -> bool:
+  """Whether simulate() runs the loop as one linear recurrence."""
+  return (getattr(plant, "linear", False)
+          and isinstance(controller, StateFeedbackRegulator)
+          and (estimator is None
+               or isinstance(estimator, (StateEstimator, SteadyStateKalmanFilter))))
+
+def advise_step(plant,
+                controller=None,
+                estimator=None,
+                stepper: str="rk2",
+                x: ArrayLike=None) -> StepAdvice:
+  """Largest stable time step of a stepper on a loop.
+
+  plant: what we are controlling
+  controller: optional controller
+  estimator: optional state estimator
+  stepper: str: name in STEPPERS, or "exact"
+  x: ArrayLike: operating point of nonlinear plants
+
+  returns: StepAdvice"""
+  if stepper != "exact" and stepper not in STABILITY_POLYNOMIALS:
+    raise ValueError(f"unknown stepper {stepper!r}, expected one of "
+                     f"{tuple(STABILITY_POLYNOMIALS) + ('exact',)}")
+  spectrum = closed_loop_spectrum(plant, controller, estimator, x)
+  unstable = spectrum[spectrum.real > _SLACK*max(1.0, np.abs(spectrum).max())]
+  region_delta_t, limiting = stability_limit(spectrum, stepper)
+
+  max_delta_t = region_delta_t
+  # The Kalman filter only exists at its own step, there's nothing to search
+  if (_fast(plant, controller, estimator) and len(unstable) == 0
+      and not isinstance(estimator, SteadyStateKalmanFilter)):
+    guess = region_delta_t
+    if not np.isfinite(guess):
+      guess = 1/max(np.abs(spectrum).max(), _SLACK)
+    max_delta_t = _recurrence_limit(plant, controller, estimator, stepper, guess)
+
+  return StepAdvice(stepper=stepper, max_delta_t=max_delta_t,
+                    region_delta_t=region_delta_t, limiting_eigenvalue=limiting,
+                    spectrum=spectrum, unstable=unstable)
+
+def auto_step(plant,
+              controller,
+              estimator,
+              stepper: str,
+              x_0: ArrayLike,
+              t_0: float,
+              t_f: float) -> float:
+  """delta_t="auto": SAFETY times the largest stable step, but at
+  least a hundred steps over the horizon. Stability isn't accuracy, use
+  select_integrator() for that.
+
+  A loop with no stability limit (any stable loop under "exact", zero
+  order hold is stable at every step) just gets the hundred steps.
+
+  returns: time step"""
+  x = None if getattr(plant, "linear", False) else x_0
+  advice = advise_step(plant, controller, estimator, stepper, x)
+  if not advice.max_delta_t > 0:
+    raise ValueError(f"the {stepper} loop has no usable stability limit "
+                     f"(max stable step {advice.max_delta_t:g}), pass delta_t")
+  return min(SAFETY*advice.max_delta_t, (t_f - t_0)/100)
+
+def check_step(plant, controller, estimator, delta_t: float, stepper: str) -> None:
+  """Warn if the fast path's recurrence grows while the loop it
+  simulates decays, i.e. if the run is going to diverge because of
+  delta_t alone.
+
+  Sweeps rerun the same loop many times, so the spectral radius of each
+  recurrence is remembered (by its matrix) instead of redone every run."""
+  M = _loop_matrices(plant, controller, estimator, delta_t, stepper)[0]
+  key = hashlib.sha1(np.ascontiguousarray(M).tobytes() + repr(M.shape).encode()).digest()
+  radius = _checked.get(key)
+  if radius is None:
+    radius = _spectral_radius(M)
+    if len(_checked) >= _CHECKED_SIZE:
+      _checked.pop(next(iter(_checked)))
+    _checked[key] = radius
+  if radius <= 1 + _SLACK:
+    return
+  advice = advise_step(plant, controller, estimator, stepper)
+  if len(advice.unstable):
+    return
+  warnings.warn(f"delta_t={delta_t:g} is past the largest stable step of the "
+                f"{stepper} loop ({advice.max_delta_t:.3g}), the run will diverge "
+                f"(growth {radius:.3g} per step)", RuntimeWarning, stacklevel=3)
@@ -0,0 +1,126 @@
+"""Stop conditions that end a simulate() run early.
+
+Pass a StopCondition as simulate(..., stop=stop) and the run ends at the
+first sample where the loop has settled, blown past a norm bound or gone
+NaN. The logs come back truncated at that sample (included), and the
+condition keeps the reason:
+
+  stop = StopCondition(settle_tol=0.02, settle_hold=1.0, target=1.0, max_norm=1E6)
+  t, x, u = simulate(plant, controller, x_0, 0, 14, 1E-3, stop=stop)
+  stop.reason, stop.t_stop  # "settled", 2.317
+
+Samples are checked in blocks as the run goes, so a run overshoots its
+stop by at most a block of steps before being cut back.
+"""
+
+import numpy as np
+from numpy.typing import ArrayLike
+
+# Why a run ended early, the values StopCondition.reason takes
+REASONS = ("settled", "diverged", "nan")
+
+
+class StopCondition:
+  """Settling, divergence and NaN checks for one simulate() run at a
+  time (reset at the start of every run)."""
+  def __init__(self,
+               settle_tol: float=None,
+               settle_hold: float=0.5,
+               target: ArrayLike=None,
+               signal: str="y",
+               max_norm: float=None,
+               nan: bool=True) -> None:
+    """Pick the checks.
+
+    settle_tol: float: settled once the signal stays within this of
+      target (every element), or without a target within this of where
+      it last left the band, None to never stop on settling
+    settle_hold: float: how long it has to stay in the band, in seconds
+    target: ArrayLike: value the signal settles to, e.g. the setpoint
+    signal: str: "y" for the plant output (noise free), "x" for the state
+    max_norm: float: stop once the state's 2-norm is past this
+    nan: bool: stop on the first non-finite state"""
+    if signal not in ("x", "y"):
+      raise ValueError(f"signal must be 'x' or 'y', got {signal!r}")
+    self.settle_tol = settle_tol
+    self.settle_hold = settle_hold
+    self.target = None if target is None else np.ravel(target)
+    self.signal = signal
+    self.max_norm = max_norm
+    self.nan = nan
+    self.reset()
+
+  @property
+  def needs_output(self) -> bool:
+    """Whether check() needs the plant output of the samples."""
+    return self.settle_tol is not None and self.signal == "y"
+
+  def reset(self) -> None:
+    """Forget the last run."""
+    self.reason = None
+    self.index = None
+    self.t_stop = None
+    self._anchor = None
+    self._since = None
+
+  def check(self, t_vals: ArrayLike, x_vals: ArrayLike, y_vals: ArrayLike=None,
+            offset: int=0) -> int:
+    """Scan the next consecutive samples of the run, carrying the
+    settling state over from the previous call.
+
+    t_vals: ArrayLike: (T,) times of the samples
+    x_vals: ArrayLike: (T, n) states
+    y_vals: ArrayLike: (T, p) outputs, when needs_output
+    offset: int: index of the first sample in the whole run
+
+    returns: index (in the whole run) of the sample the run stops at,
+      None to carry on"""
+    end, reason = len(t_vals), None
+    if self.nan:
+      bad = ~np.isfinite(x_vals).all(axis=1)
+      if bad.any():
+        end, reason = int(np.argmax(bad)), "nan"
+    if self.max_norm is not None:
+      with np.errstate(invalid="ignore", over="ignore"):
+        over = np.einsum("ij,ij->i", x_vals[:end], x_vals[:end]) > self.max_norm**2
+      if over.any():
+        end, reason = int(np.argmax(over)), "diverged"
+    if self.settle_tol is not None:
+      signal = x_vals if self.signal == "x" else y_vals
+      settled = self._settle(t_vals[:end], np.reshape(signal[:end], (end, -1)))
+      if settled is not None:
+        end, reason = settled, "settled"
+
+    if reason is None:
+      return None
+    self.reason = reason
+    self.index = offset + end
+    self.t_stop = float(t_vals[end])
+    return self.index
+
+  def _settle(self, t_vals: ArrayLike, signal: ArrayLike) -> int:
+    """First sample that completes settle_hold inside the band."""
+    k = 0
+    while k < len(signal):
+      if self.target is None and self._anchor is None:
+        self._anchor, self._since = signal[k], t_vals[k]
+      center = self.target if self.target is not None else self._anchor
+      out = np.abs(signal[k:] - center).max(axis=1) > self.settle_tol
+      inside = int(np.argmax(out)) if out.any() else len(out)
+      if inside:
+        if self._since is None:
+          self._since = t_vals[k]
+        held = np.flatnonzero(t_vals[k:k+inside] - self._since >= self.settle_hold)
+        if len(held):
+          return k + int(held[0])
+      if inside == len(out):
+        return None
+
+      # Left the band: start over from there
+      k += inside
+      if self.target is None:
+        self._anchor, self._since = signal[k], t_vals[k]
+      else:
+        self._since = None
+      k += 1
+    return None
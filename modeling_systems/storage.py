@@ -0,0 +1,374 @@
+"""Trajectories on disk, compressed column by column in chunks.
+
+A trajectory file is a zip archive, like .npz, holding
+
+  meta.json   the metadata header: plant (matrices, config), controller
+              (gains), estimator, delta_t, stepper, recording, state
+              names, plus the layout of every column and the time span
+              of every chunk
+  x/000003    chunk 3 of the x column: CHUNK samples, filtered, then
+              zlib compressed (one member per column and chunk)
+
+Reading a time window only decompresses the chunks it overlaps, so a
+long run can be looked into without loading it:
+
+  save_trajectory("run.traj", traj, controller=controller, delta_t=1E-3, stepper="rk2")
+  with TrajectoryFile("run.traj") as f:
+    f.meta["controller"]["k"]
+    window = f.read(t_start=2.0, t_stop=2.5, columns=("x", "u"), plant=plant)
+
+Before zlib, every chunk goes through lossless filters:
+
+  delta     difference between consecutive samples, taken on the bit
+            patterns as integers (so nothing is rounded). Neighbouring
+            samples of a smooth signal share their sign, exponent and
+            top mantissa bits, so the differences are mostly zero bytes.
+  shuffle   byte planes stored one after another (every sample's first
+            byte, then every second byte, ...), which puts those zero
+            bytes together.
+"""
+
+import functools
+import hashlib
+import json
+import types
+import zipfile
+import zlib
+import numpy as np
+from dataclasses import asdict, fields, is_dataclass
+from typing import Sequence
+
+from .recording import Recording
+from .trajectory import Trajectory
+
+# Version of the file layout, in meta.json
+FORMAT = 1
+
+# Samples per chunk
+CHUNK = 8192
+
+FILTERS = ("delta", "shuffle")
+
+
+class _Undescribable(TypeError):
+  """Raised by _describe(strict=True) for an object it can't tell apart
+  from others of its type."""
+
+
+def _code(code: types.CodeType) -> str:
+  """Digest of a code object: bytecode, names and constants, nested code
+  (inner functions, comprehensions) included."""
+  digest = hashlib.sha256(code.co_code)
+  digest.update(repr(code.co_names).encode())
+  for const in code.co_consts:
+    if isinstance(const, types.CodeType):
+      const = _code(const)
+    elif isinstance(const, frozenset):
+      # Set order changes with string hashing from one process to the next
+      const = sorted(map(repr, const))
+    digest.update(repr(const).encode())
+  return digest.hexdigest()
+
+def _global_names(code: types.CodeType) -> set:
+  """Names code (and the code nested in it) may look up as globals."""
+  names = set(code.co_names)
+  for const in code.co_consts:
+    if isinstance(const, types.CodeType):
+      names |= _global_names(const)
+  return names
+
+def _class(cls: type) -> dict:
+  """A class by name, plus the code of its methods when it isn't one of
+  ours (ours are covered by the package version)."""
+  description = {"name": f"{cls.__module__}.{cls.__qualname__}"}
+  if not cls.__module__.startswith(__package__):
+    description["methods"] = {
+      f"{base.__qualname__}.{name}": _code(value.__code__)
+      for base in cls.__mro__ if base is not object
+      for name, value in vars(base).items() if isinstance(value, types.FunctionType)}
+  return description
+
+def _describe(obj, _seen: set=None, strict: bool=False):
+  """JSON-able description of a plant, controller, estimator or config:
+  its type and attributes, arrays as nested lists.
+
+  Functions are described by their code, the globals it names, closure
+  and defaults, bound methods by their instance too, so two lambdas (or
+  two instances' methods) don't look alike.
+
+  obj: what to describe
+  strict: bool: raise _Undescribable for objects that would only be
+    described by their type (no attributes to tell them apart), instead
+    of describing them that way
+
+  returns: nested dicts, lists and scalars"""
+  if obj is None or isinstance(obj, (bool, int, float, str)):
+    return obj
+  if isinstance(obj, complex):
+    # Poles, JSON has no complex numbers
+    return {"real": float(obj.real), "imag": float(obj.imag)}
+  if isinstance(obj, np.generic):
+    return _describe(obj.item(), _seen, strict)
+  if isinstance(obj, np.ndarray):
+    if obj.dtype.kind in "cO":
+      return _describe(obj.tolist(), _seen, strict)
+    return obj.tolist()
+  if isinstance(obj, bytes):
+    return obj.hex()
+  if isinstance(obj, (list, tuple)):
+    return [_describe(value, _seen, strict) for value in obj]
+  if isinstance(obj, (set, frozenset)):
+    return sorted((_describe(value, _seen, strict) for value in obj), key=json.dumps)
+  if isinstance(obj, dict):
+    return {str(key): _describe(value, _seen, strict) for key, value in obj.items()}
+  if isinstance(obj, types.ModuleType):
+    return {"type": "module", "name": obj.__name__}
+  if isinstance(obj, type):
+    return {"type": "class", **_class(obj)}
+  if isinstance(obj, (types.BuiltinFunctionType, np.ufunc)):
+    owner = getattr(obj, "__self__", None)
+    name = f"{getattr(obj, '__module__', None)}.{getattr(obj, '__qualname__', obj.__name__)}"
+    if owner is None or isinstance(owner, types.ModuleType):
+      return {"type": "builtin", "name": name}
+    return {"type": "builtin", "name": name, "self": _describe(owner, _seen, strict)}
+
+  _seen = set() if _seen is None else _seen
+  kind = f"{type(obj).__module__}.{type(obj).__qualname__}"
+  if id(obj) in _seen:
+    return {"type": kind, "cycle": True}
+  _seen = _seen | {id(obj)}
+  describe = lambda value: _describe(value, _seen, strict)
+  if isinstance(obj, types.FunctionType):
+    code = obj.__code__
+    names = sorted(_global_names(code) & set(obj.__globals__))
+    cells = [cell.cell_contents for cell in obj.__closure__ or ()]
+    return {"type": "function", "name": obj.__qualname__, "code": _code(code),
+            "globals": {name: describe(obj.__globals__[name]) for name in names},
+            "closure": describe(cells), "defaults": describe(obj.__defaults__),
+            "kwdefaults": describe(obj.__kwdefaults__)}
+  if isinstance(obj, types.MethodType):
+    return {"type": "method", "self": describe(obj.__self__),
+            "function": describe(obj.__func__)}
+  if isinstance(obj, functools.partial):
+    return {"type": "partial", "func": describe(obj.func),
+            "args": describe(obj.args), "keywords": describe(obj.keywords)}
+  if is_dataclass(obj):
+    return {"type": kind, **{field.name: describe(getattr(obj, field.name))
+                             for field in fields(obj)}}
+
+  attributes = dict(getattr(obj, "__dict__", {}))
+  for base in type(obj).__mro__:
+    slots = vars(base).get("__slots__", ())
+    for name in [slots] if isinstance(slots, str) else slots:
+      if name not in ("__dict__", "__weakref__") and hasattr(obj, name):
+        attributes[name] = getattr(obj, name)
+  if not attributes and not hasattr(obj, "__dict__"):
+    if strict:
+      raise _Undescribable(f"can't describe a {kind} beyond its type")
+    return {"type": kind}
+  methods = _class(type(obj)).get("methods")
+  return {"type": kind, **({"methods": methods} if methods else {}),
+          **{name: describe(value) for name, value in attributes.items()}}
+
+def _encode(values: np.ndarray, filters: Sequence[str], level: int) -> bytes:
+  """Filtered, compressed bytes of a chunk."""
+  values = np.ascontiguousarray(values, dtype=values.dtype.newbyteorder("<"))
+  size = values.dtype.itemsize
+  if "delta" in filters and size in (1, 2, 4, 8):
+    ints = values.view(f"<u{size}")
+    # Unsigned, so differences wrap around instead of overflowing
+    values = np.concatenate((ints[:1], ints[1:] - ints[:-1]))
+  data = values.view(np.uint8).reshape(len(values), -1, size)
+  if "shuffle" in filters:
+    data = data.transpose(2, 1, 0)
+  return zlib.compress(np.ascontiguousarray(data).tobytes(), level)
+
+def _decode(blob: bytes, dtype: str, shape: tuple, count: int,
+            filters: Sequence[str]) -> np.ndarray:
+  """Chunk of count samples back from _encode()."""
+  dtype = np.dtype(dtype).newbyteorder("<")
+  size = dtype.itemsize
+  elements = int(np.prod(shape, dtype=int))
+  data = np.frombuffer(zlib.decompress(blob), dtype=np.uint8)
+  if "shuffle" in filters:
+    data = data.reshape(size, elements, count).transpose(2, 1, 0)
+  data = np.ascontiguousarray(data).reshape(count, elements*size)
+  if "delta" in filters and size in (1, 2, 4, 8):
+    data = np.cumsum(data.view(f"<u{size}"), axis=0, dtype=f"<u{size}").view(np.uint8)
+  return data.view(dtype).reshape((count,) + tuple(shape)).astype(dtype.newbyteorder("="))
+
+def save_trajectory(path: str,
+                    traj: Trajectory,
+                    controller=None,
+                    estimator=None,
+                    delta_t: float=None,
+                    stepper: str=None,
+                    metadata: dict=None,
+                    chunk: int=CHUNK,
+                    level: int=6,
+                    filters: Sequence[str]=FILTERS) -> None:
+  """Write a Trajectory (t, x and every log it has) to a trajectory file.
+
+  The plant is described from traj, the rest of the header comes from
+  the arguments, since a Trajectory doesn't keep them.
+
+  path: str: file to write
+  traj: Trajectory: result of simulate() or simulate_final()
+  controller: the controller of the run, for its gains
+  estimator: the estimator of the run
+  delta_t: float: time step of the run, the first step of t by default
+  stepper: str: stepper of the run
+  metadata: dict: anything else worth keeping, JSON-able
+  chunk: int: samples per chunk, what a partial read decompresses at least
+  level: int: zlib level, 0-9
+  filters: Sequence[str]: filters of FILTERS to apply before zlib"""
+  from . import __version__
+  t = np.asarray(traj.t)
+  if delta_t is None and len(t) > 1:
+    delta_t = float(t[1] - t[0])
+  columns = {"t": t, "x": np.asarray(traj.x)}
+  columns.update((name, np.asarray(values)) for name, values in traj.logs.items())
+  meta = {
+    "format": FORMAT,
+    "version": __version__,
+    "plant": _describe(traj.plant),
+    "controller": _describe(controller),
+    "estimator": _describe(estimator),
+    "setpoint": _describe(traj.setpoint),
+    "delta_t": delta_t,
+    "stepper": stepper,
+    "states": list(traj.states),
+    "recording": _describe(asdict(traj.recording)),
+    "outputs": list(traj.outputs),
+    "metadata": _describe(metadata),
+    "length": len(t),
+    "chunk": chunk,
+    "filters": list(filters),
+    "columns": {name: {"dtype": values.dtype.str, "shape": list(values.shape[1:])}
+                for name, values in columns.items()},
+    "chunks": [[float(t[start]), float(t[min(start + chunk, len(t)) - 1])]
+               for start in range(0, len(t), chunk)],
+  }
+  # Chunks are compressed already, the archive only stores them
+  with zipfile.ZipFile(path, "w", zipfile.ZIP_STORED) as archive:
+    archive.writestr("meta.json", json.dumps(meta))
+    for name, values in columns.items():
+      for k, start in enumerate(range(0, len(t), chunk)):
+        archive.writestr(f"{name}/{k:06d}", _encode(values[start:start+chunk], filters, level))
+
+
+class TrajectoryFile:
+  """A trajectory file opened for (partial) reading."""
+  def __init__(self, path: str) -> None:
+    """Open a file and read its header.
+
+    path: str: file written by save_trajectory()"""
+    self.path = path
+    self._archive = zipfile.ZipFile(path)
+    self.meta = json.loads(self._archive.read("meta.json"))
+    if self.meta["format"] > FORMAT:
+      raise ValueError(f"{path} is format {self.meta['format']}, this version "
+                       f"reads up to {FORMAT}")
+
+  def __enter__(self) -> "TrajectoryFile":
+    return self
+
+  def __exit__(self, *exc) -> None:
+    self.close()
+
+  def close(self) -> None:
+    self._archive.close()
+
+  def __len__(self) -> int:
+    return self.meta["length"]
+
+  @property
+  def columns(self) -> tuple:
+    """Names of the stored columns."""
+    return tuple(self.meta["columns"])
+
+  def _chunk(self, name: str, k: int) -> np.ndarray:
+    meta = self.meta
+    column = meta["columns"][name]
+    count = min(meta["chunk"], meta["length"] - k*meta["chunk"])
+    return _decode(self._archive.read(f"{name}/{k:06d}"), column["dtype"],
+                   column["shape"], count, meta["filters"])
+
+  def _window(self, t_start: float, t_stop: float) -> tuple:
+    """First and last chunk, and the sample range, of a time window."""
+    spans = np.asarray(self.meta["chunks"]).reshape(-1, 2)
+    first = 0 if t_start is None else int(np.searchsorted(spans[:, 1], t_start, side="left"))
+    last = len(spans) if t_stop is None else int(np.searchsorted(spans[:, 0], t_stop, side="right"))
+    last = max(last, first)
+    t = self._column("t", first, last)
+    lo = 0 if t_start is None else int(np.searchsorted(t, t_start, side="left"))
+    hi = len(t) if t_stop is None else int(np.searchsorted(t, t_stop, side="right"))
+    return first, last, lo, hi
+
+  def _column(self, name: str, first: int, last: int) -> np.ndarray:
+    column = self.meta["columns"][name]
+    if last <= first:
+      return np.zeros((0,) + tuple(column["shape"]), dtype=column["dtype"])
+    return np.concatenate([self._chunk(name, k) for k in range(first, last)])
+
+  def column(self, name: str, t_start: float=None, t_stop: float=None) -> np.ndarray:
+    """One column over a time window, decompressing only the chunks the
+    window overlaps.
+
+    name: str: "t", "x" or a log ("u", "y", "xhat")
+    t_start: float: first time included, the start of the run by default
+    t_stop: float: last time included, the end of the run by default
+
+    returns: the samples with t_start <= t <= t_stop"""
+    if name not in self.meta["columns"]:
+      raise KeyError(f"{self.path} has no column {name!r}, it has {self.columns}")
+    first, last, lo, hi = self._window(t_start, t_stop)
+    return self._column(name, first, last)[lo:hi]
+
+  def read(self,
+           columns: Sequence[str]=None,
+           t_start: float=None,
+           t_stop: float=None,
+           plant=None) -> Trajectory:
+    """A Trajectory over a time window.
+
+    columns: Sequence[str]: logs to read besides t and x, all of them by
+      default
+    t_start: float: first time included, the start of the run by default
+    t_stop: float: last time included, the end of the run by default
+    plant: the plant of the run, for named columns and y (the file
+      only has its description)
+
+    returns: Trajectory"""
+    meta = self.meta
+    logs = [name for name in meta["columns"] if name not in ("t", "x")]
+    if columns is not None:
+      missing = set(columns) - set(meta["columns"])
+      if missing:
+        raise KeyError(f"{self.path} has no column {sorted(missing)}, it has {self.columns}")
+      logs = [name for name in logs if name in columns]
+    first, last, lo, hi = self._window(t_start, t_stop)
+    t = self._column("t", first, last)[lo:hi]
+    x = self._column("x", first, last)[lo:hi]
+    values = {name: self._column(name, first, last)[lo:hi] for name in logs}
+    setpoint = meta["setpoint"] if not isinstance(meta["setpoint"], dict) else None
+    return Trajectory(t, x, values, [name for name in meta["outputs"] if name in values],
+                      plant=plant, setpoint=setpoint, recording=Recording(**meta["recording"]))
+
+
+def load_trajectory(path: str,
+                    columns: Sequence[str]=None,
+                    t_start: float=None,
+                    t_stop: float=None,
+                    plant=None) -> Trajectory:
+  """Read a trajectory file, or a time window of it.
+
+  path: str: file written by save_trajectory()
+  columns: Sequence[str]: logs to read besides t and x, all by default
+  t_start: float: first time included, the start of the run by default
+  t_stop: float: last time included, the end of the run by default
+  plant: the plant of the run, for named columns and y
+
+  returns: Trajectory"""
+  with TrajectoryFile(path) as f:
+    return f.read(columns, t_start, t_stop, plant)
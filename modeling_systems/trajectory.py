@@ -0,0 +1,153 @@
+"""simulate()'s result, with named columns.
+
+A Trajectory is still the (t, x, *outputs) tuple simulate() returns, so
+`t, x, u = simulate(...)` keeps working, with names on top:
+
+  traj = simulate(DCMotor(cfg), controller, x_0, 0, 3, 1E-3, outputs=("u",))
+  traj.theta        # x[:, 1], named by the plant's states
+  traj.u            # the u log, as asked for in outputs
+  traj.y            # y = Cx at every sample, computed on first access
+  traj.error        # setpoint - y
+  traj.cost(Q, R)   # running quadratic cost
+
+Columns are views into the logs, nothing is copied. Derived signals are
+computed once and cached. The y log (the measurement each step started
+from, with any sensor noise) is traj.measured.
+"""
+
+import numpy as np
+from numpy.typing import ArrayLike
+from typing import Sequence
+
+from .recording import Recording
+
+# Attribute -> log it reads
+_LOGS = {
+  "u": "u",
+  "xhat": "xhat",
+  "measured": "y",
+}
+
+
+class Trajectory(tuple):
+  """(t, x, *outputs) with named views and cached derived signals."""
+  def __new__(cls,
+              t: ArrayLike,
+              x: ArrayLike,
+              logs: dict=None,
+              outputs: Sequence[str]=(),
+              plant=None,
+              setpoint=None,
+              recording: Recording=None):
+    """Wrap simulate()'s logs.
+
+    t: ArrayLike: (T,) time
+    x: ArrayLike: (T, ..., n) states
+    logs: dict: the other logs by name ("u", "y", "xhat")
+    outputs: Sequence[str]: logs that follow t and x in the tuple
+    plant: the plant, for its state names and output
+    setpoint: float or callable of t, for error
+    recording: Recording: how the logs were recorded, if thinned"""
+    logs = dict(logs or {})
+    self = super().__new__(cls, (t, x) + tuple(logs[name] for name in outputs))
+    self.t = t
+    self.x = x
+    self.logs = logs
+    self.outputs = tuple(outputs)
+    self.plant = plant
+    self.setpoint = setpoint
+    self.recording = recording if recording is not None else Recording()
+    states = getattr(plant, "states", None)
+    if states is not None and self.recording.states is not None:
+      states = [states[i] for i in self.recording.states]
+    self.states = tuple(states) if states is not None else ()
+    self._cache = {}
+    return self
+
+  def __reduce__(self):
+    return (Trajectory, (self.t, self.x, self.logs, self.outputs, self.plant,
+                         self.setpoint, self.recording))
+
+  def __getattr__(self, name: str):
+    """State columns by name, and the logs."""
+    if name.startswith("__"):
+      raise AttributeError(name)
+    if name in _LOGS:
+      if _LOGS[name] in self.logs:
+        return self.logs[_LOGS[name]]
+      raise AttributeError(f"{_LOGS[name]!r} wasn't logged, ask simulate() for it in outputs")
+    states = self.__dict__.get("states", ())
+    if name in states:
+      return self.x[..., states.index(name)]
+    raise AttributeError(f"{type(self).__name__!r} object has no attribute {name!r}")
+
+  def __dir__(self):
+    return sorted(set(super().__dir__()) | set(self.states) | set(_LOGS))
+
+  def _check_full(self, what: str) -> None:
+    if self.recording.states is not None or self.recording.envelope:
+      raise ValueError(f"{what} needs the whole state at every sample, "
+                       "not a selection or an envelope")
+
+  @property
+  def y(self) -> ArrayLike:
+    """Noise-free plant output y(x) at every sample (1-D for single
+    output plants)."""
+    if "y" not in self._cache:
+      self._check_full("y")
+      plant = self.plant
+      if getattr(plant, "linear", False):
+        C = np.reshape(np.asarray(plant.C, dtype=float), (-1, self.x.shape[-1]))
+        y = self.x@C.T
+      else:
+        y = np.array([np.ravel(plant.output(x)) for x in self.x])
+      self._cache["y"] = y[..., 0] if y.shape[-1] == 1 else y
+    return self._cache["y"]
+
+  @property
+  def reference(self) -> ArrayLike:
+    """Setpoint at every sample."""
+    if "reference" not in self._cache:
+      if self.setpoint is None:
+        raise ValueError("the controller has no setpoint")
+      if callable(self.setpoint):
+        r = np.array([self.setpoint(t) for t in self.t], dtype=float)
+      else:
+        r = np.full(len(self.t), self.setpoint, dtype=float)
+      self._cache["reference"] = r
+    return self._cache["reference"]
+
+  @property
+  def error(self) -> ArrayLike:
+    """Tracking error setpoint - y at every sample."""
+    if "error" not in self._cache:
+      y = self.y
+      r = np.reshape(self.reference, (len(self.t),) + (1,)*(y.ndim - 1))
+      self._cache["error"] = r - y
+    return self._cache["error"]
+
+  def cost(self, Q: ArrayLike=None, R: ArrayLike=None) -> ArrayLike:
+    """Running cost J(t_i) = sum over the steps before t_i of
+    (x'Qx + u'Ru) delta_t, with x at the start of each step and u held
+    over it.
+
+    Q: ArrayLike: state weight, identity by default
+    R: ArrayLike: input weight, identity by default (needs the u log)
+
+    returns: (T, ...) running cost, J[0] = 0"""
+    self._check_full("cost")
+    n = self.x.shape[-1]
+    Q = np.eye(n) if Q is None else np.atleast_2d(np.asarray(Q, dtype=float))
+    u = self.u
+    u = u[..., None] if u.ndim == self.x.ndim - 1 else u
+    R = np.eye(u.shape[-1]) if R is None else np.atleast_2d(np.asarray(R, dtype=float))
+    key = ("cost", Q.tobytes(), R.tobytes())
+    if key not in self._cache:
+      x = self.x[:-1]
+      running = (np.einsum("...i,ij,...j->...", x, Q, x)
+                 + np.einsum("...i,ij,...j->...", u[1:], R, u[1:]))
+      delta_t = np.reshape(np.diff(self.t), (-1,) + (1,)*(running.ndim - 1))
+      J = np.zeros((len(self.t),) + running.shape[1:])
+      np.cumsum(running*delta_t, axis=0, out=J[1:])
+      self._cache[key] = J
+    return self._cache[key]